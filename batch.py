@@ -0,0 +1,129 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Deque, Dict, IO, Iterator, Optional, Tuple
+
+from core import QUERY_LIMIT, ChatEngine
+from remote import API_URL, APP_ID_ENV, RATE, WolframAlphaProvider
+from response_cache import ResponseCache
+from storage import KnowledgeBaseStore
+
+QUERY_FIELDS = ("query", "text", "question")
+
+
+def read_queries(stream: IO[str], field: Optional[str] = None) -> Iterator[Tuple[object, str]]:
+    # Accepts {"id": ..., "query": "..."} objects or bare JSON strings, one per line
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            logging.warning(f"Skipping line {line_number}: not valid JSON")
+            continue
+        if isinstance(record, str):
+            yield line_number, record
+            continue
+        fields = (field,) if field else QUERY_FIELDS
+        text = next((record[name] for name in fields if isinstance(record, dict) and name in record), None)
+        if not isinstance(text, str):
+            logging.warning(f"Skipping line {line_number}: no query field")
+            continue
+        yield record.get("id", line_number), text
+
+
+def run_batch(engine: ChatEngine, queries: Iterator[Tuple[object, str]], output: IO[str], workers: int = 8,
+              window: int = 1000, dedupe_size: int = 100000) -> Dict[str, int]:
+    stats = {"queries": 0, "unique": 0, "duplicates": 0, "errors": 0}
+    # Results are written in input order; at most `window` queries are in flight,
+    # so memory stays flat no matter how long the input is.
+    pending: Deque[Tuple[object, str, Future]] = deque()
+    answered: "OrderedDict[str, Future]" = OrderedDict()
+
+    def write_oldest():
+        query_id, text, future = pending.popleft()
+        try:
+            response = future.result()
+            result = {"id": query_id, "query": text, "answer": response.text, "intent": response.intent}
+            if response.url:
+                result["url"] = response.url
+        except Exception as e:
+            stats["errors"] += 1
+            result = {"id": query_id, "query": text, "error": str(e)}
+        output.write(json.dumps(result) + "\n")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for query_id, text in queries:
+            stats["queries"] += 1
+            future = answered.get(text)
+            if future is None:
+                future = executor.submit(engine.answer, text)
+                answered[text] = future
+                stats["unique"] += 1
+                if len(answered) > dedupe_size:
+                    answered.popitem(last=False)
+            else:
+                answered.move_to_end(text)
+                stats["duplicates"] += 1
+            pending.append((query_id, text, future))
+            while len(pending) > window:
+                write_oldest()
+        while pending:
+            write_oldest()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of queries in bulk, one JSONL result per query")
+    parser.add_argument("input", help="JSONL file of queries, or - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="JSONL file for results, or - for stdout")
+    parser.add_argument("--field", help="name of the query field (default: query, text or question)")
+    parser.add_argument("--workers", type=int, default=8, help="concurrent lookups")
+    parser.add_argument("--window", type=int, default=1000, help="queries in flight before output must catch up")
+    parser.add_argument("--dedupe", type=int, default=100000, help="recent distinct queries remembered for dedup")
+    parser.add_argument("--knowledge-base", default="knowledge_base.json")
+    parser.add_argument("--query-count", default="query_count.json")
+    parser.add_argument("--query-limit", type=int, default=QUERY_LIMIT)
+    parser.add_argument("--response-cache", default="response_cache.json")
+    parser.add_argument("--app-id", default=os.environ.get(APP_ID_ENV),
+                        help=f"Wolfram Alpha App ID, by default from ${APP_ID_ENV}")
+    parser.add_argument("--wolfram-url", default=API_URL)
+    parser.add_argument("--rate", type=float, default=RATE, help="Wolfram Alpha requests per second")
+    parser.add_argument("--offline", action="store_true", help="answer from the knowledge base and cache only")
+    args = parser.parse_args()
+    if not args.offline and not args.app_id:
+        parser.error(f"set {APP_ID_ENV}, pass --app-id or answer --offline")
+
+    client = None
+    if not args.offline:
+        # Queue for rate limit tokens as long as it takes rather than failing queries
+        client = WolframAlphaProvider(args.app_id, args.wolfram_url, rate=args.rate, max_rate_wait=float("inf"))
+    response_cache = ResponseCache(args.response_cache, max_entries=max(10000, args.dedupe), autosave=False)
+    engine = ChatEngine(KnowledgeBaseStore(args.knowledge_base).load(), client, response_cache, args.query_limit,
+                        args.query_count)
+
+    source = sys.stdin if args.input == "-" else open(args.input, 'r')
+    output = sys.stdout if args.output == "-" else open(args.output, 'w')
+    start = time.perf_counter()
+    try:
+        stats = run_batch(engine, read_queries(source, args.field), output, args.workers, args.window, args.dedupe)
+    finally:
+        response_cache.save()
+        if source is not sys.stdin:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+    elapsed = time.perf_counter() - start
+    print(f"{stats['queries']} queries ({stats['unique']} unique, {stats['duplicates']} duplicates, "
+          f"{stats['errors']} errors) in {elapsed:.1f} s; {engine.query_count}/{engine.query_limit} remote queries used",
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
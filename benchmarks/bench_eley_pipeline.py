@@ -0,0 +1,68 @@
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.fakes import FakeClient, FakeDevice, FakeSpeech, ScriptedInput, SlowOfflineEngine
+from eley import ChatBot
+from metrics import TRACER
+
+UTTERANCES = ["hello", "what is the speed of light", "who is my dad", "how far is the moon", "whats up"]
+
+
+class BenchChatBot(ChatBot):
+    playback_delay = 0.0
+
+    @TRACER.traced("playback")
+    def play_audio(self, audio_file: str):
+        time.sleep(self.playback_delay)
+
+
+def run(turns: int, overlap: bool, args) -> float:
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        utterances = [UTTERANCES[turn % len(UTTERANCES)] + f" {turn}" for turn in range(turns)]
+        bot = BenchChatBot("", 10 ** 6, "knowledge_base.json", "query_count.json", "", 0,
+                           tts_engine=SlowOfflineEngine(args.tts),
+                           client=FakeClient(args.query),
+                           speech=FakeSpeech(ScriptedInput(utterances), args.listen, args.recognize),
+                           device=FakeDevice(),
+                           overlap_speech=overlap)
+        bot.playback_delay = args.playback
+        TRACER.reset()
+        start = time.perf_counter()
+        asyncio.run(bot.chat_bot())
+        elapsed = time.perf_counter() - start
+    latencies = sorted(bot.turn_latencies)
+    mode = "overlapped" if overlap else "sequential"
+    print(f"{mode:>10}: {turns} turns in {elapsed:6.2f} s  "
+          f"turn latency p50 {statistics.median(latencies) * 1000:7.1f} ms  "
+          f"max {latencies[-1] * 1000:7.1f} ms")
+    for stage in TRACER.to_json()["stages"]:
+        print(f"{stage['stage']:>20} {stage['intent']:>15}: {stage['count']:3}  "
+              f"mean {stage['sum'] / stage['count'] * 1000:7.1f} ms")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time ChatBot turns against fake speech, Wolfram and TTS stages")
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--listen", type=float, default=0.2, help="seconds spent capturing an utterance")
+    parser.add_argument("--recognize", type=float, default=0.1)
+    parser.add_argument("--query", type=float, default=0.3)
+    parser.add_argument("--tts", type=float, default=0.1)
+    parser.add_argument("--playback", type=float, default=0.5)
+    args = parser.parse_args()
+    cwd = os.getcwd()
+    try:
+        sequential = run(args.turns, False, args)
+        overlapped = run(args.turns, True, args)
+    finally:
+        os.chdir(cwd)
+    print(f"speedup {sequential / overlapped:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+import argparse
+import gc
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, List
+
+from benchmarks.bench_matcher import WORDS, make_questions
+from knowledge_base import KnowledgeBase
+from matcher import FuzzyMatcher, _char_keys
+
+
+class DictMatcher(FuzzyMatcher):
+    # The matcher's index as it was: a set of question indexes per key
+    def add(self, question: str):
+        index = len(self._questions)
+        self._questions.append(question)
+        for key in _char_keys(question):
+            self._postings.setdefault(key, set()).add(index)
+        self._size += 1
+
+
+class DictKnowledgeBase:
+    # The knowledge base as it was: the parsed JSON, one dict per entry
+    def __init__(self, data: dict):
+        self.data = data
+        self.matcher = DictMatcher()
+        self._index = {}
+        for position, entry in enumerate(data["questions"]):
+            self._index.setdefault(entry["question"], position)
+            self.matcher.add(entry["question"])
+
+    @property
+    def questions(self) -> List[str]:
+        return [entry["question"] for entry in self.data["questions"]]
+
+
+def make_text(size: int, rng: random.Random) -> str:
+    # Answers are a sentence or two, and some are shared, like the fixed replies
+    shared = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 40))) for _ in range(50)]
+    entries = [{"question": question,
+                "answer": rng.choice(shared) if rng.random() < 0.1 else
+                " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 40)))}
+               for question in make_questions(size, rng)]
+    return json.dumps({"questions": entries})
+
+
+def measure(label: str, size: int, text: str, build: Callable[[dict], object]):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    knowledge_base = build(json.loads(text))  # The parsed JSON is garbage unless the knowledge base keeps it
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    start = time.perf_counter()
+    knowledge_base.questions
+    questions_call = time.perf_counter() - start
+    tracemalloc.stop()
+    print(f"{size:>8} {label:>18}: {current / 2 ** 20:8.1f} MiB held ({current / size:6.0f} B/entry)  "
+          f"peak {peak / 2 ** 20:8.1f} MiB  build {elapsed:6.2f} s  .questions {questions_call * 1000:7.2f} ms")
+    return knowledge_base
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Heap held by the knowledge base and its matcher, per tracemalloc")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000],
+                        help="e.g. 1000000 for the largest (the dict layout needs a few GiB)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    for size in args.sizes:
+        text = make_text(size, random.Random(args.seed))
+        measure("dicts + sets", size, text, DictKnowledgeBase)
+        compact = measure("compact", size, text, KnowledgeBase)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "knowledge_base.json.answers")
+            mapped = measure("compact + mmap", size, text, lambda data: KnowledgeBase(data, answers_path=path))
+            # Same answers either way
+            sample = random.Random(size).sample(compact.questions, min(size, 1000))
+            assert all(mapped.get_answer(question) == compact.get_answer(question) for question in sample)
+            del mapped
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from typing import List, Tuple
+
+from benchmarks.bench_matcher import make_questions
+from knowledge_base import KnowledgeBase
+from learning import Learner
+from storage import KnowledgeBaseStore
+
+
+def write_knowledge_base(file_path: str, size: int, rng: random.Random):
+    entries = [{"question": question, "answer": f"Answer {number}"}
+               for number, question in enumerate(make_questions(size, rng))]
+    with open(file_path, 'w') as file:
+        json.dump({"questions": entries}, file)
+
+
+def make_lessons(count: int, rng: random.Random) -> List[Tuple[str, str]]:
+    return [(f"{question} {number}", f"Learned {number}") for number, question in enumerate(make_questions(count, rng))]
+
+
+def rewrite_json(file_path: str, lessons: List[Tuple[str, str]]) -> Tuple[float, float]:
+    # yash.py's old "teach the bot" block: add to the parsed file and write all of it back
+    knowledge_base = KnowledgeBase.load(file_path)
+    start = time.perf_counter()
+    for question, answer in lessons:
+        knowledge_base.add(question, answer)
+        with open(file_path, 'w') as file:
+            json.dump(knowledge_base.to_dict(), file, indent=2)
+    elapsed = time.perf_counter() - start
+    return elapsed, elapsed
+
+
+def store_add(file_path: str, lessons: List[Tuple[str, str]]) -> Tuple[float, float]:
+    # One log append and fsync per lesson, on the turn
+    store = KnowledgeBaseStore(file_path, snapshot=False)
+    knowledge_base = store.load()
+    start = time.perf_counter()
+    for question, answer in lessons:
+        store.add(knowledge_base, question, answer)
+    elapsed = time.perf_counter() - start
+    return elapsed, elapsed
+
+
+def learner(file_path: str, lessons: List[Tuple[str, str]]) -> Tuple[float, float]:
+    store = KnowledgeBaseStore(file_path, snapshot=False)
+    knowledge_base = store.load()
+    background = Learner(store, knowledge_base, max_pending=len(lessons)).start()
+    start = time.perf_counter()
+    for question, answer in lessons:
+        background.learn(question, answer)
+    queued = time.perf_counter() - start
+    background.flush()
+    elapsed = time.perf_counter() - start
+    background.close()
+    assert len(knowledge_base) == len(store.load()), "lessons missing after reload"
+    return elapsed, queued
+
+
+WRITERS = {"rewrite JSON": rewrite_json, "store.add": store_add, "Learner": learner}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lessons per second taught to knowledge bases of growing size, "
+                                                 "and the time each one costs the turn that teaches it")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--lessons", type=int, default=2000)
+    parser.add_argument("--rewrite-lessons", type=int, default=20, help="the JSON rewrite is too slow for more")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        for name, writer in WRITERS.items():
+            count = args.rewrite_lessons if writer is rewrite_json else args.lessons
+            rng = random.Random(args.seed)
+            with tempfile.TemporaryDirectory() as directory:
+                file_path = os.path.join(directory, "knowledge_base.json")
+                write_knowledge_base(file_path, size, rng)
+                elapsed, on_turn = writer(file_path, make_lessons(count, rng))
+            print(f"{size:>8} {name:>14}: {count / elapsed:10.0f} lessons/s  "
+                  f"{on_turn / count * 1e6:10.1f} us per lesson on the turn")
+        print()
+
+
+if __name__ == '__main__':
+    main()
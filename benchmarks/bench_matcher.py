@@ -0,0 +1,64 @@
+import argparse
+import random
+import time
+from difflib import get_close_matches
+from typing import List
+
+from matcher import FuzzyMatcher
+
+WORDS = ("who what when where why how is are was the my your a of in to do does can "
+         "name dad mother sister grandma grandpa life world best smartest weather time "
+         "today tomorrow capital france moon sun planet distance speed light water boil "
+         "temperature eley hello hey up cutest baby universe programmer lady beautiful").split()
+
+
+def make_questions(count: int, rng: random.Random) -> List[str]:
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 8))) + rng.choice(["", "?"])
+            for _ in range(count)]
+
+
+def perturb(question: str, rng: random.Random) -> str:
+    chars = list(question)
+    for _ in range(rng.randint(0, 3)):
+        if chars:
+            chars[rng.randrange(len(chars))] = rng.choice("abcdefghijklmnopqrstuvwxyz ")
+    return "".join(chars)
+
+
+def run(size: int, query_count: int, seed: int):
+    rng = random.Random(seed)
+    questions = make_questions(size, rng)
+    queries = [perturb(rng.choice(questions), rng) for _ in range(query_count // 2)]
+    queries += make_questions(query_count - len(queries), rng)
+
+    start = time.perf_counter()
+    matcher = FuzzyMatcher(questions)
+    build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    expected = [get_close_matches(query, questions, n=1, cutoff=0.6) for query in queries]
+    linear = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actual = [matcher.close_matches(query, n=1) for query in queries]
+    indexed = time.perf_counter() - start
+
+    assert actual == expected, "indexed matcher disagrees with get_close_matches"
+    print(f"{size:>8} questions  build {build * 1000:8.1f} ms  "
+          f"difflib {linear / len(queries) * 1000:8.2f} ms/query  "
+          f"indexed {indexed / len(queries) * 1000:8.2f} ms/query  "
+          f"speedup {linear / indexed:6.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare FuzzyMatcher against difflib.get_close_matches")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    for size in args.sizes:
+        run(size, args.queries, args.seed)
+
+
+if __name__ == '__main__':
+    main()
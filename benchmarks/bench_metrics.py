@@ -0,0 +1,78 @@
+import argparse
+import json
+import random
+import time
+
+from benchmarks.bench_matcher import make_questions
+from core import ChatEngine
+from knowledge_base import KnowledgeBase
+from metrics import TRACER, Tracer
+
+
+def span_overhead(tracer: Tracer, spans: int) -> float:
+    @tracer.traced("noop")
+    def noop():
+        pass
+
+    start = time.perf_counter()
+    with tracer.turn():
+        for _ in range(spans):
+            noop()
+    return (time.perf_counter() - start) / spans
+
+
+def bare_overhead(spans: int) -> float:
+    def noop():
+        pass
+
+    start = time.perf_counter()
+    for _ in range(spans):
+        noop()
+    return (time.perf_counter() - start) / spans
+
+
+def traced_turns(turns: int, size: int) -> Tracer:
+    # Text turns through the real engine: every stage recorded, labelled by intent
+    rng = random.Random(0)
+    questions = make_questions(size, rng)
+    knowledge_base = KnowledgeBase({"questions": [{"question": question, "answer": f"Answer {number}"}
+                                                  for number, question in enumerate(questions)]})
+    engine = ChatEngine(knowledge_base)
+    inputs = ["tell me a joke", "i am so happy", "thank you"] + questions[:20] + ["zzz qqq xxx"]
+    TRACER.reset()
+    for _ in range(turns):
+        with TRACER.turn():
+            engine.respond(rng.choice(inputs))
+    return TRACER
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the cost of tracing spans and show the exported metrics")
+    parser.add_argument("--spans", type=int, default=200000)
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--size", type=int, default=1000)
+    parser.add_argument("--prometheus", action="store_true", help="print the Prometheus text instead of a summary")
+    args = parser.parse_args()
+
+    bare = bare_overhead(args.spans)
+    enabled = span_overhead(Tracer(), args.spans)
+    disabled = span_overhead(Tracer(enabled=False), args.spans)
+    print(f"per call: bare {bare * 1e9:6.0f} ns  traced {enabled * 1e9:6.0f} ns  "
+          f"tracing disabled {disabled * 1e9:6.0f} ns")
+
+    tracer = traced_turns(args.turns, args.size)
+    if args.prometheus:
+        print(tracer.prometheus(), end="")
+        return
+    report = tracer.to_json()
+    for intent, turn in report["turns"].items():
+        print(f"turn {intent:>15}: {turn['count']:5} turns  p50 <= {turn['p50'] * 1000:6.1f} ms  "
+              f"p95 <= {turn['p95'] * 1000:6.1f} ms")
+    for stage in report["stages"]:
+        print(f"{stage['stage']:>8} {stage['intent']:>15}: {stage['count']:5} spans  "
+              f"mean {stage['sum'] / stage['count'] * 1000:7.3f} ms  p95 <= {stage['p95'] * 1000:6.1f} ms")
+    print(f"JSON export {len(json.dumps(report))} bytes, Prometheus export {len(tracer.prometheus())} bytes")
+
+
+if __name__ == '__main__':
+    main()
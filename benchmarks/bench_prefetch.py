@@ -0,0 +1,92 @@
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+from typing import List, Optional
+
+from benchmarks.bench_matcher import make_questions
+from benchmarks.fakes import FakeClient
+from core import ChatEngine, Session
+from knowledge_base import KnowledgeBase
+from prefetch import Prefetcher
+from response_cache import ResponseCache
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Sessions of related questions, the way people follow up on an answer
+CONVERSATIONS = [
+    ["what is the capital of france", "what is the population of france", "how big is it", "what about germany"],
+    ["who is albert einstein", "how old is he", "where is he"],
+    ["how far away is the moon", "how big is it", "what about the sun"],
+    ["who is my dad", "who is my mother", "who is my sister", "who is my grandma"],
+    ["what is the speed of light", "what is the speed of sound"],
+    ["what is mount everest", "how big is it", "where is it", "what about k2"],
+    ["who is marie curie", "where is she", "how old is she"],
+    ["what is the capital of japan", "what about italy", "what is the population of italy"],
+]
+
+
+def run(knowledge_base: KnowledgeBase, rounds: int, prefetch: bool, args) -> List[float]:
+    client = FakeClient(args.remote_delay)
+    engine = ChatEngine(knowledge_base, client, ResponseCache(), query_limit=10 ** 6)
+    prefetcher: Optional[Prefetcher] = None
+    if prefetch:
+        prefetcher = Prefetcher(engine, match_budget=args.match_budget, remote_budget=args.remote_budget)
+    latencies = []
+    try:
+        for _ in range(rounds):
+            for conversation in CONVERSATIONS:
+                session = Session()
+                for text in conversation:
+                    if prefetcher is not None:
+                        prefetcher.before_turn()
+                    start = time.perf_counter()
+                    engine.respond(text, session)
+                    latencies.append(time.perf_counter() - start)
+                    if prefetcher is not None:
+                        prefetcher.after_turn(session)
+                    time.sleep(args.playback + args.listen)  # The reply plays, then the user asks again
+    finally:
+        if prefetcher is not None:
+            prefetcher.close()
+    label = "prefetch" if prefetch else "no prefetch"
+    print(f"{label:>12}: turn p50 {statistics.median(latencies) * 1000:7.1f} ms  "
+          f"mean {statistics.mean(latencies) * 1000:7.1f} ms  max {max(latencies) * 1000:7.1f} ms  "
+          f"remote queries {client.queries}")
+    if prefetcher is not None:
+        report = prefetcher.report()
+        print(f"{'':>12}  issued {report['issued']}  hits {report['hits']} ({report['hit_rate']:.0%})  "
+              f"remote {report['remote']}  over budget {report['over_budget']}  wasted {report['wasted']}")
+        for source, counts in report["sources"].items():
+            print(f"{source:>40}: {counts['hits']:3}/{counts['issued']:<3} ({counts['hit_rate']:.0%})")
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Turn latency of follow-up questions with and without "
+                                                 "speculative prefetching while replies play")
+    parser.add_argument("--size", type=int, default=10000, help="knowledge base size, padded with generated questions")
+    parser.add_argument("--rounds", type=int, default=2, help="times through the conversations")
+    parser.add_argument("--remote-delay", type=float, default=0.3, help="seconds per fake Wolfram Alpha query")
+    parser.add_argument("--playback", type=float, default=0.5, help="seconds each reply plays")
+    parser.add_argument("--listen", type=float, default=1.0, help="seconds until the next question is recognized")
+    parser.add_argument("--match-budget", type=int, default=6)
+    parser.add_argument("--remote-budget", type=int, default=1)
+    args = parser.parse_args()
+
+    with open(os.path.join(ROOT, "knowledge_base.json"), 'r') as file:
+        entries = json.load(file)["questions"]
+    entries += [{"question": question, "answer": f"Answer {number}"}
+                for number, question in enumerate(make_questions(max(0, args.size - len(entries)),
+                                                                 random.Random(0)))]
+    print(f"{sum(map(len, CONVERSATIONS)) * args.rounds} turns, {args.size} questions, "
+          f"{args.remote_delay * 1000:.0f} ms per remote query, {args.playback * 1000:.0f} ms playback, "
+          f"{args.listen * 1000:.0f} ms listening")
+    run(KnowledgeBase({"questions": entries}), args.rounds, False, args)
+    run(KnowledgeBase({"questions": entries}), args.rounds, True, args)
+
+
+if __name__ == '__main__':
+    main()
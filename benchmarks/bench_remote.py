@@ -0,0 +1,103 @@
+import argparse
+import http.client
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+
+from benchmarks.fake_wolfram import FakeWolframServer
+from remote import CircuitBreaker, CircuitOpenError, RemoteError, WolframAlphaProvider
+
+
+def unpooled_query(url: str, question: str) -> bytes:
+    # What wolframalpha.Client does per query: a fresh connection every time
+    parts = urlsplit(url)
+    connection = http.client.HTTPConnection(parts.netloc, timeout=10)
+    try:
+        connection.request("GET", f"{parts.path}?{urlencode({'appid': 'x', 'input': question, 'output': 'json'})}")
+        return connection.getresponse().read()
+    finally:
+        connection.close()
+
+
+def throughput(server: FakeWolframServer, queries: int, workers: int):
+    questions = [f"question {number}" for number in range(queries)]
+    provider = WolframAlphaProvider("bench", server.url, max_connections=workers, rate=1e9, burst=workers)
+    with ThreadPoolExecutor(workers) as executor:
+        start = time.perf_counter()
+        list(executor.map(lambda question: unpooled_query(server.url, question), questions))
+        unpooled = time.perf_counter() - start
+        before = server.connections
+        start = time.perf_counter()
+        list(executor.map(provider.query, questions))
+        pooled = time.perf_counter() - start
+    provider.close()
+    print(f"{queries} queries, {workers} threads: new connection each {queries / unpooled:7.0f} q/s, "
+          f"pooled {queries / pooled:7.0f} q/s over {server.connections - before} connections")
+
+
+def coalescing(server: FakeWolframServer, callers: int):
+    provider = WolframAlphaProvider("bench", server.url, rate=1e9, burst=callers)
+    server.latency, before = 0.2, server.requests
+    with ThreadPoolExecutor(callers) as executor:
+        start = time.perf_counter()
+        answers = list(executor.map(lambda _: next(provider.query("what is the speed of light").results).text,
+                                    range(callers)))
+        elapsed = time.perf_counter() - start
+    server.latency = 0.0
+    assert len(set(answers)) == 1
+    print(f"{callers} identical concurrent queries: {server.requests - before} request(s) in {elapsed * 1000:.0f} ms, "
+          f"{provider.stats['coalesced']} coalesced")
+
+
+def retries_and_breaker(server: FakeWolframServer):
+    provider = WolframAlphaProvider("bench", server.url, rate=1e9, burst=100, backoff=0.01,
+                                    breaker=CircuitBreaker(failure_threshold=3, reset_timeout=0.2))
+    server.failures = 2
+    answer = next(provider.query("retried question").results).text
+    print(f"two 503s then success: {answer!r} after {provider.stats['retries']} retries")
+
+    server.down, before = True, server.requests
+    outcomes = []
+    for number in range(6):
+        try:
+            provider.query(f"down {number}")
+            outcomes.append("ok")
+        except CircuitOpenError:
+            outcomes.append("open")
+        except RemoteError:
+            outcomes.append("failed")
+    print(f"service down: {' '.join(outcomes)} ({server.requests - before} requests sent)")
+
+    server.down = False
+    time.sleep(0.25)
+    answer = next(provider.query("after recovery").results).text
+    print(f"after reset timeout: {answer!r}, breaker {provider.breaker.state}")
+
+
+def rate_limit(server: FakeWolframServer, rate: float, queries: int):
+    provider = WolframAlphaProvider("bench", server.url, rate=rate, burst=1)
+    start = time.perf_counter()
+    for number in range(queries):
+        provider.query(f"limited {number}")
+    elapsed = time.perf_counter() - start
+    print(f"{queries} queries at {rate:.0f}/s limit took {elapsed:.2f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exercise WolframAlphaProvider against a local fake API")
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    server = FakeWolframServer().start()
+    try:
+        throughput(server, args.queries, args.workers)
+        coalescing(server, 50)
+        retries_and_breaker(server)
+        rate_limit(server, 20, 21)
+    finally:
+        server.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+import argparse
+import random
+import shutil
+import tempfile
+import time
+
+from benchmarks.bench_matcher import make_questions, perturb
+from semantic import DIMENSIONS, SemanticIndex
+
+
+def run(size: int, query_count: int, dimensions: int, seed: int):
+    rng = random.Random(seed)
+    questions = make_questions(size, rng)
+    queries = [perturb(rng.choice(questions), rng) for _ in range(query_count)]
+    directory = tempfile.mkdtemp()
+    try:
+        start = time.perf_counter()
+        SemanticIndex.open(directory, questions, dimensions)
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        index = SemanticIndex.open(directory, questions, dimensions)
+        reopen = time.perf_counter() - start
+
+        start = time.perf_counter()
+        hits = sum(index.best_match(query) is not None for query in queries)
+        search = (time.perf_counter() - start) / len(queries)
+    finally:
+        shutil.rmtree(directory)
+    print(f"{size:>8} questions  build+save {build * 1000:8.1f} ms  reopen (mmap) {reopen * 1000:6.1f} ms  "
+          f"query {search * 1000:6.2f} ms  {hits}/{len(queries)} matched")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time building, reopening and querying the semantic index")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dimensions", type=int, default=DIMENSIONS)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    for size in args.sizes:
+        run(size, args.queries, args.dimensions, args.seed)
+
+
+if __name__ == '__main__':
+    main()
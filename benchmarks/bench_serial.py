@@ -0,0 +1,74 @@
+import argparse
+import asyncio
+import time
+
+from benchmarks.fake_arduino import FakeArduino
+from device import SerialDevice
+
+COMMANDS = ["turn_on", "turn_off"]
+
+
+def blocking_baseline(commands: int) -> float:
+    # The old send_command_to_arduino: open, sleep 2 s, then write and readline() per command
+    import serial
+
+    arduino = FakeArduino(boot_delay=0.2).start()
+    try:
+        start = time.perf_counter()
+        connection = serial.Serial(arduino.port, 9600, timeout=1)
+        time.sleep(2)
+        connection.reset_input_buffer()
+        startup = time.perf_counter() - start
+        start = time.perf_counter()
+        for number in range(commands):
+            connection.write((COMMANDS[number % 2] + '\n').encode())
+            connection.readline()
+        elapsed = time.perf_counter() - start
+        connection.close()
+    finally:
+        arduino.close()
+    print(f"blocking readline: startup {startup:5.2f} s  {commands} commands {elapsed * 1000:7.1f} ms")
+    return elapsed
+
+
+async def channel(commands: int, ready: bool, tagged: bool, pipelined: bool) -> float:
+    arduino = FakeArduino(boot_delay=0.2, ready=ready).start()
+    device = SerialDevice(arduino.port, tagged=tagged)
+    try:
+        start = time.perf_counter()
+        await device.open()
+        await device.wait_ready()
+        startup = time.perf_counter() - start
+        names = [COMMANDS[number % 2] for number in range(commands)]
+        start = time.perf_counter()
+        if pipelined:
+            replies = await asyncio.gather(*(device.command(name) for name in names))
+        else:
+            replies = [await device.command(name) for name in names]
+        elapsed = time.perf_counter() - start
+        expected = [arduino.reply(name) for name in names]
+        assert replies == expected, "replies were matched to the wrong commands"
+    finally:
+        await device.close()
+        arduino.close()
+    stats = device.latency_stats()["turn_on"]
+    mode = ("pipelined" if pipelined else "one at a time") + (", tagged" if tagged else "")
+    print(f"{mode:>19}: startup {startup:5.2f} s{'' if ready else ' (no READY)'}  {commands} commands "
+          f"{elapsed * 1000:7.1f} ms  turn_on p50 {stats['p50'] * 1000:5.1f} ms p95 {stats['p95'] * 1000:5.1f} ms")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the async Arduino channel with blocking readline() on a fake pty device")
+    parser.add_argument("--commands", type=int, default=50)
+    args = parser.parse_args()
+    baseline = blocking_baseline(args.commands)
+    asyncio.run(channel(args.commands, True, False, False))
+    pipelined = asyncio.run(channel(args.commands, True, False, True))
+    asyncio.run(channel(args.commands, True, True, True))
+    asyncio.run(channel(4, False, False, True))
+    print(f"pipelining speedup {baseline / pipelined:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
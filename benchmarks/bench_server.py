@@ -0,0 +1,87 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import time
+from typing import List
+
+from benchmarks.fakes import FakeClient
+from core import ChatEngine
+from response_cache import ResponseCache
+from server import ChatServer, read_websocket_frame, websocket_frame
+from storage import KnowledgeBaseStore
+
+QUERIES = ["hello", "who is my dad", "what is your name?", "tell me a joke", "i am bored", "thank you",
+           "google weather", "how far is the moon", "what is the speed of light", "whats up eley"]
+
+
+async def http_client(port: int, requests: int, latencies: List[float], rng: random.Random):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    session = None
+    for _ in range(requests):
+        body = json.dumps({"text": rng.choice(QUERIES), "session": session}).encode()
+        start = time.perf_counter()
+        writer.write(b"POST /chat HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                     b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body)
+        await writer.drain()
+        head = await reader.readuntil(b"\r\n\r\n")
+        length = int(next(line.split(b":")[1] for line in head.split(b"\r\n")
+                          if line.lower().startswith(b"content-length")))
+        payload = json.loads(await reader.readexactly(length))
+        latencies.append(time.perf_counter() - start)
+        session = payload["session"]
+    writer.close()
+
+
+async def websocket_client(port: int, requests: int, latencies: List[float], rng: random.Random):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(b"GET /ws HTTP/1.1\r\nHost: localhost\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                 b"Sec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==\r\nSec-WebSocket-Version: 13\r\n\r\n")
+    await reader.readuntil(b"\r\n\r\n")
+    for _ in range(requests):
+        start = time.perf_counter()
+        writer.write(websocket_frame(rng.choice(QUERIES).encode(), mask=os.urandom(4)))
+        await writer.drain()
+        await read_websocket_frame(reader)
+        latencies.append(time.perf_counter() - start)
+    writer.close()
+
+
+async def run(args):
+    knowledge_base = KnowledgeBaseStore(args.knowledge_base).load()
+    engine = ChatEngine(knowledge_base, FakeClient(args.remote_delay), ResponseCache(), query_limit=10 ** 9)
+    server = ChatServer(engine, workers=args.workers)
+    port = await server.start(port=0)
+    client = websocket_client if args.websocket else http_client
+    latencies: List[float] = []
+    rng = random.Random(args.seed)
+    start = time.perf_counter()
+    await asyncio.gather(*(client(port, args.requests, latencies, random.Random(rng.random()))
+                           for _ in range(args.clients)))
+    elapsed = time.perf_counter() - start
+    await server.close()
+
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{'websocket' if args.websocket else 'http'}: {args.clients} clients x {args.requests} requests  "
+          f"{len(latencies) / elapsed:8.1f} req/s  p50 {statistics.median(latencies) * 1000:7.2f} ms  "
+          f"p99 {p99 * 1000:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the ELEY HTTP/WebSocket server")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=40, help="requests per client")
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--remote-delay", type=float, default=0.05, help="seconds per fake Wolfram query")
+    parser.add_argument("--knowledge-base", default="knowledge_base.json")
+    parser.add_argument("--websocket", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+import argparse
+import os
+import random
+import statistics
+import time
+from typing import Callable, List, Optional
+
+from benchmarks.bench_matcher import make_questions, perturb
+from matcher import FuzzyMatcher
+from sharding import ShardedMatcher
+
+
+def time_queries(match: Callable[[str], List[str]], queries: List[str]) -> List[float]:
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        match(query)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def report(label: str, latencies: List[float], single: Optional[float] = None):
+    mean = statistics.mean(latencies)
+    speedup = f"  {single / mean:5.2f}x" if single else ""
+    print(f"{label:>22}: mean {mean * 1000:8.2f} ms  p50 {statistics.median(latencies) * 1000:8.2f} ms  "
+          f"max {max(latencies) * 1000:8.2f} ms{speedup}")
+
+
+def main():
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="Fuzzy match latency with the questions sharded over 1 to N "
+                                                 "processes, checked against the single-process matcher")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100000], help="e.g. 1000000 for the largest")
+    parser.add_argument("--processes", type=int, nargs="+",
+                        default=sorted({1, 2, 4, 8, cores} & set(range(1, cores + 1))) or [1])
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--n", type=int, default=1, help="matches per query, 1 as in find_best_match")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{cores} cores")
+    for size in args.sizes:
+        rng = random.Random(args.seed)
+        questions = make_questions(size, rng)
+        # Half misheard knowledge-base questions, half questions it doesn't have
+        queries = [perturb(rng.choice(questions), rng) for _ in range(args.queries // 2)]
+        queries += make_questions(args.queries - len(queries), rng)
+
+        matcher = FuzzyMatcher(questions)
+        expected = [matcher.close_matches(query, args.n) for query in queries]
+        single = time_queries(lambda query: matcher.close_matches(query, args.n), queries)
+        print(f"{size} questions, {len(queries)} queries")
+        report("FuzzyMatcher", single)
+        for processes in args.processes:
+            start = time.perf_counter()
+            with ShardedMatcher(questions, processes, matcher.cutoff) as sharded:
+                started = time.perf_counter() - start
+                found = [sharded.close_matches(query, args.n) for query in queries]
+                assert found == expected, f"{processes} processes disagree with FuzzyMatcher"
+                latencies = time_queries(lambda query: sharded.close_matches(query, args.n), queries)
+            report(f"{processes} processes", latencies, statistics.mean(single))
+            print(f"{'':>22}  started in {started:.2f} s, results identical")
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+import argparse
+import array
+import math
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+import wave
+from typing import List, Optional, Tuple
+
+from speech import (SAMPLE_RATE, BufferedStream, EnergyVAD, RecognitionStream, RecognizerBackend, SpeechFrontEnd,
+                    WavSource)
+
+
+def write_speech_wav(path: str, word_counts: List[int], rng: random.Random, sample_rate: int = SAMPLE_RATE,
+                     word: float = 0.25, word_gap: float = 0.12, pause: float = 1.5, noise: float = 60.0) -> List[float]:
+    # Room noise with bursts of voiced "words"; returns where each utterance's speech ends
+    samples = array.array('h')
+    ends = []
+
+    def silence(seconds: float):
+        samples.extend(int(rng.gauss(0, noise)) for _ in range(int(seconds * sample_rate)))
+
+    silence(0.6)
+    for words in word_counts:
+        for position in range(words):
+            pitch = rng.uniform(110, 240)
+            samples.extend(int(4000 * math.sin(2 * math.pi * pitch * n / sample_rate) + rng.gauss(0, noise))
+                           for n in range(int(word * sample_rate)))
+            if position < words - 1:
+                silence(word_gap)
+        ends.append(len(samples) / sample_rate)
+        silence(pause)
+    with wave.open(path, 'wb') as audio:
+        audio.setnchannels(1)
+        audio.setsampwidth(2)
+        audio.setframerate(sample_rate)
+        audio.writeframes(samples.tobytes())
+    return ends
+
+
+class FakeStream(RecognitionStream):
+    def __init__(self, backend: "FakeBackend", sample_rate: int):
+        self.backend = backend
+        self.sample_rate = sample_rate
+
+    def accept(self, frame: bytes):
+        # Decoding keeps pace with the audio, well inside real time
+        time.sleep(self.backend.decode * len(frame) / 2 / self.sample_rate)
+
+    def result(self) -> str:
+        time.sleep(self.backend.overhead)
+        return self.backend.next_text()
+
+
+class FakeBackend(RecognizerBackend):
+    # Costs decode seconds per second of audio plus a fixed overhead per
+    # utterance; a streaming one pays the decode cost while speech is arriving
+    name = "fake"
+
+    def __init__(self, streaming: bool, decode: float = 0.3, overhead: float = 0.05):
+        self.streaming = streaming
+        self.decode = decode
+        self.overhead = overhead
+        self.count = 0
+
+    def next_text(self) -> str:
+        self.count += 1
+        return f"utterance {self.count}"
+
+    def stream(self, sample_rate: int) -> RecognitionStream:
+        if self.streaming:
+            return FakeStream(self, sample_rate)
+        return BufferedStream(self.recognize, sample_rate)
+
+    def recognize(self, audio: bytes, sample_rate: int) -> str:
+        time.sleep(self.decode * len(audio) / 2 / sample_rate + self.overhead)
+        return self.next_text()
+
+
+def run(label: str, path: str, ends: List[float], end_silence: float, streaming: bool, args,
+        results: List[Optional[Tuple[str, List[float], int]]], slot: int):
+    source = WavSource(path)
+    front_end = SpeechFrontEnd(source, FakeBackend(streaming, args.decode, args.overhead), EnergyVAD(),
+                               end_silence=end_silence).start()
+    latencies = []
+    try:
+        while True:
+            utterance = front_end.listen()
+            # Against the known end of speech in the file, not the VAD's estimate of it
+            latencies.append(utterance.finished - (source.started + ends[len(latencies)]))
+    except (EOFError, IndexError):
+        pass
+    results[slot] = (label, latencies, len(latencies))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-of-speech to text latency of the speech front end on a "
+                                                 "synthetic WAV file, replayed in real time")
+    parser.add_argument("--utterances", type=int, default=6)
+    parser.add_argument("--decode", type=float, default=0.3, help="recognizer seconds per second of audio")
+    parser.add_argument("--overhead", type=float, default=0.05, help="recognizer seconds per utterance")
+    parser.add_argument("--wav", help="also keep the generated WAV here, e.g. for speech.py transcribe")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    word_counts = [rng.randint(2, 8) for _ in range(args.utterances)]
+    with tempfile.TemporaryDirectory() as directory:
+        path = args.wav or os.path.join(directory, "speech.wav")
+        ends = write_speech_wav(path, word_counts, rng)
+        configs = [("0.8 s pause, whole clip (old)", 0.8, False),
+                   ("VAD 0.5 s, whole clip", 0.5, False),
+                   ("VAD 0.5 s, streaming", 0.5, True)]
+        # Each replay takes as long as the file, so they run side by side
+        results: List[Optional[Tuple[str, List[float], int]]] = [None] * len(configs)
+        threads = [threading.Thread(target=run, args=(label, path, ends, end_silence, streaming, args, results, slot))
+                   for slot, (label, end_silence, streaming) in enumerate(configs)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    print(f"{len(ends)} utterances of {min(word_counts)}-{max(word_counts)} words, "
+          f"{time.perf_counter() - start:.1f} s of audio")
+    for label, latencies, found in results:
+        print(f"{label:>30}: {found}/{len(ends)} utterances  end of speech to text "
+              f"p50 {statistics.median(latencies) * 1000:6.0f} ms  max {max(latencies) * 1000:6.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List, Tuple
+
+from benchmarks.bench_matcher import make_questions
+from storage import KnowledgeBaseStore
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def time_to_prompt(command: List[str]) -> float:
+    # Wall clock from spawning the interpreter until "You: " is printed
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=ROOT, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                               stderr=subprocess.DEVNULL)
+    seen = b""
+    while not seen.endswith(b"You: "):
+        chunk = os.read(process.stdout.fileno(), 64)
+        if not chunk:
+            raise RuntimeError(f"{' '.join(command)} exited before prompting")
+        seen += chunk
+    elapsed = time.perf_counter() - start
+    process.communicate(b"quit\n")
+    return elapsed
+
+
+def import_breakdown(top: int) -> List[Tuple[int, str]]:
+    result = subprocess.run([sys.executable, "-X", "importtime", "main.py"], cwd=ROOT, input=b"quit\n",
+                            capture_output=True)
+    rows = []
+    for line in result.stderr.decode().splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Only top-level imports, so nested modules aren't counted twice
+        if name.startswith("  "):
+            continue
+        rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def snapshot_load(size: int, repeat: int):
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "knowledge_base.json")
+        with open(path, 'w') as file:
+            json.dump({"questions": [{"question": question, "answer": f"Answer {number}"}
+                                     for number, question in enumerate(make_questions(size, rng))]}, file)
+        timings = {}
+        for snapshot in (False, True):
+            store = KnowledgeBaseStore(path, snapshot=snapshot)
+            store.load()  # Writes the snapshot the first time
+            start = time.perf_counter()
+            for _ in range(repeat):
+                store.load()
+            timings[snapshot] = (time.perf_counter() - start) / repeat
+    print(f"{size:>8} questions  JSON {timings[False] * 1000:8.1f} ms  snapshot {timings[True] * 1000:8.1f} ms  "
+          f"speedup {timings[False] / timings[True]:4.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure time to first prompt, import costs and KB load times")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    args = parser.parse_args()
+
+    for label, command in (("main.py (text mode)", [sys.executable, "main.py"]),
+                           ("yash.py", [sys.executable, "yash.py"])):
+        timings = sorted(time_to_prompt(command) for _ in range(args.runs))
+        print(f"{label:>20}: first prompt p50 {statistics.median(timings) * 1000:6.1f} ms  "
+              f"max {timings[-1] * 1000:6.1f} ms")
+
+    print("\nslowest top-level imports of main.py (python -X importtime, cumulative):")
+    for cumulative, name in import_breakdown(args.top):
+        print(f"  {cumulative / 1000:7.1f} ms  {name}")
+
+    print()
+    for size in args.sizes:
+        snapshot_load(size, 3 if size < 100000 else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from storage import KnowledgeBaseStore, QueryCounter
+
+
+def make_knowledge_base(size: int) -> dict:
+    return {"questions": [{"question": f"what is fact number {index}?", "answer": f"Fact {index} is true."}
+                          for index in range(size)]}
+
+
+def run(size: int, writes: int, fsync: bool):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "knowledge_base.json")
+        data = make_knowledge_base(size)
+        with open(path, 'w') as file:
+            json.dump(data, file, indent=2)
+
+        # What save_knowledge_base used to do for every taught answer
+        start = time.perf_counter()
+        for index in range(writes):
+            data["questions"].append({"question": f"taught {index}", "answer": "yes"})
+            with open(path, 'w') as file:
+                json.dump(data, file, indent=2)
+                file.flush()
+                if fsync:
+                    os.fsync(file.fileno())
+        rewrite = (time.perf_counter() - start) / writes
+
+        store = KnowledgeBaseStore(path, compact_every=10 ** 9, fsync=fsync)
+        knowledge_base = store.load()
+        start = time.perf_counter()
+        for index in range(writes):
+            store.add(knowledge_base, f"logged {index}", "yes")
+        append = (time.perf_counter() - start) / writes
+
+        start = time.perf_counter()
+        store.compact()
+        compact = time.perf_counter() - start
+
+        counter = QueryCounter(os.path.join(directory, "query_count.json"), fsync=fsync)
+        start = time.perf_counter()
+        for _ in range(writes):
+            counter.increment()
+        increment = (time.perf_counter() - start) / writes
+
+    print(f"{size:>8} questions  full rewrite {rewrite * 1000:9.3f} ms/write  "
+          f"log append {append * 1000:7.3f} ms/write  counter {increment * 1000:7.3f} ms/write  "
+          f"compaction {compact * 1000:9.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare full JSON rewrites with write-ahead log appends")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--writes", type=int, default=50)
+    parser.add_argument("--no-fsync", action="store_true")
+    args = parser.parse_args()
+    for size in args.sizes:
+        run(size, args.writes, not args.no_fsync)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+import argparse
+import statistics
+import tempfile
+import time
+
+from benchmarks.fakes import SlowOfflineEngine
+from tts import AudioCache, StreamingSpeaker
+
+SENTENCE = "The speed of light in vacuum is exactly two hundred ninety nine million meters per second."
+
+
+def run(sentences: int, args):
+    text = " ".join([SENTENCE] * sentences)
+    whole, streamed = [], []
+    for repeat in range(args.repeats):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = AudioCache(directory, SlowOfflineEngine(seconds_per_char=args.delay))
+            # Unique text per repeat so every measurement pays for synthesis
+            reply = f"Reply {repeat} {text}"
+            start = time.perf_counter()
+            cache.get_path(reply)
+            whole.append(time.perf_counter() - start)
+
+        with tempfile.TemporaryDirectory() as directory:
+            cache = AudioCache(directory, SlowOfflineEngine(seconds_per_char=args.delay))
+            speaker = StreamingSpeaker(cache.get_path, lambda audio_file: None, workers=args.workers)
+            streamed.append(speaker.speak(f"Reply {repeat} {text}"))
+    print(f"{sentences:>3} sentences  whole-reply first audio {statistics.median(whole) * 1000:8.1f} ms  "
+          f"streamed first audio {statistics.median(streamed) * 1000:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare time to first audio for whole-reply and streamed TTS")
+    parser.add_argument("--sentences", type=int, nargs="+", default=[1, 3, 10])
+    parser.add_argument("--delay", type=float, default=0.0005, help="synthesis seconds per character")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    for sentences in args.sentences:
+        run(sentences, args)
+
+
+if __name__ == '__main__':
+    main()
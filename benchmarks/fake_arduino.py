@@ -0,0 +1,87 @@
+import os
+import pty
+import queue
+import threading
+import time
+import tty
+from typing import Iterable, List, Tuple
+
+
+class FakeArduino:
+    # A pty that behaves like the board on the other end of the USB cable: it
+    # "boots" for boot_delay seconds, prints READY (unless ready=False), then
+    # answers each command line after processing it one at a time. Replies reach
+    # the host link_latency later, like a USB-serial adapter's latency timer,
+    # without holding up the next command. Commands in `ignore` are never answered,
+    # like a line lost on the wire or a sketch that doesn't know them.
+    def __init__(self, boot_delay: float = 0.2, processing: float = 0.002, link_latency: float = 0.016,
+                 ready: bool = True, ignore: Iterable[str] = ()):
+        self.boot_delay = boot_delay
+        self.processing = processing
+        self.link_latency = link_latency
+        self.ready = ready
+        self.ignore = set(ignore)
+        self.commands: List[str] = []
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.master)
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+        self._outbox: "queue.Queue[Tuple[float, str]]" = queue.Queue()
+        self._closed = False
+
+    def start(self) -> "FakeArduino":
+        threading.Thread(target=self._run, daemon=True).start()
+        threading.Thread(target=self._deliver, daemon=True).start()
+        return self
+
+    def close(self):
+        self._closed = True
+        for fd in (self.master, self.slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def _send(self, line: str, delay: float):
+        self._outbox.put((time.perf_counter() + delay, line))
+
+    def _deliver(self):
+        # One writer keeps replies in the order they were produced
+        while not self._closed:
+            deliver_at, line = self._outbox.get()
+            time.sleep(max(0.0, deliver_at - time.perf_counter()))
+            try:
+                os.write(self.master, (line + "\n").encode())
+            except OSError:
+                return
+
+    def reply(self, command: str) -> str:
+        if command.startswith("#"):
+            tag, _, command = command.partition(" ")
+            return f"{tag} {self.reply(command)}"
+        return {"turn_on": "Light is on", "turn_off": "Light is off"}.get(command, f"Unknown command {command}")
+
+    def _run(self):
+        time.sleep(self.boot_delay)
+        self._send("booting...", 0)
+        if self.ready:
+            self._send("READY", 0)
+        buffer = b""
+        while not self._closed:
+            try:
+                data = os.read(self.master, 1024)
+            except OSError:
+                return
+            if not data:
+                return
+            buffer += data
+            while b"\n" in buffer:
+                raw, buffer = buffer.split(b"\n", 1)
+                command = raw.decode().strip()
+                if not command:
+                    continue
+                self.commands.append(command)
+                if command.rpartition(" ")[2] in self.ignore:
+                    continue
+                time.sleep(self.processing)
+                self._send(self.reply(command), self.link_latency)
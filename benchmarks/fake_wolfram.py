@@ -0,0 +1,99 @@
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlsplit
+
+
+class FakeWolframServer:
+    # Answers /v2/query like the Wolfram Alpha API (output=json) on localhost.
+    # `failures` makes the next N requests return 503 and `down` makes every
+    # request fail, so retries and the circuit breaker can be exercised.
+    def __init__(self, latency: float = 0.0, port: int = 0):
+        self.latency = latency
+        self.failures = 0
+        self.down = False
+        self.requests = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep-alive, so pooled connections are reused
+            disable_nagle_algorithm = True  # Headers and body go out in separate writes
+
+            def setup(self):
+                super().setup()
+                with fake._lock:
+                    fake.connections += 1
+
+            def do_GET(self):
+                fake.handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}/v2/query"
+
+    def start(self) -> "FakeWolframServer":
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def handle(self, request: BaseHTTPRequestHandler):
+        with self._lock:
+            self.requests += 1
+            failing = self.down or self.failures > 0
+            if self.failures > 0:
+                self.failures -= 1
+        if self.latency:
+            time.sleep(self.latency)
+        if failing:
+            self.reply(request, 503, {"error": "unavailable"})
+            return
+        question = parse_qs(urlsplit(request.path).query).get("input", [""])[0]
+        if "unknown" in question:
+            result = {"success": False, "error": False, "numpods": 0}
+        else:
+            result = {"success": True, "error": False, "pods": [
+                {"title": "Input interpretation", "subpods": [{"plaintext": question}]},
+                {"title": "Result", "primary": True, "subpods": [{"plaintext": f"Answer to {question}"}]},
+            ]}
+        self.reply(request, 200, {"queryresult": result})
+
+    def reply(self, request: BaseHTTPRequestHandler, status: int, payload: dict):
+        body = json.dumps(payload).encode()
+        request.send_response(status)
+        request.send_header("Content-Type", "application/json")
+        request.send_header("Content-Length", str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a fake Wolfram Alpha API on localhost")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+    server = FakeWolframServer(args.latency, args.port)
+    print(f"Fake Wolfram Alpha at {server.url}")
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        server.close()
+
+
+if __name__ == '__main__':
+    main()
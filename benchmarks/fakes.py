@@ -0,0 +1,113 @@
+import time
+from typing import Iterable, List
+
+from remote import Pod, RemoteResult
+from speech import Utterance
+from tts import OfflineEngine
+
+
+class ScriptedInput:
+    # Plays back queries, then "quit". The time between handing out one query
+    # and being asked for the next is the rest of that turn.
+    def __init__(self, queries: Iterable[str]):
+        self.queries = list(queries)
+        self.position = 0
+        self.turn_latencies: List[float] = []
+        self._handed_out = None
+
+    def next(self) -> str:
+        now = time.perf_counter()
+        if self._handed_out is not None:
+            self.turn_latencies.append(now - self._handed_out)
+        text = self.queries[self.position] if self.position < len(self.queries) else "quit"
+        self.position += 1
+        self._handed_out = time.perf_counter()
+        return text
+
+    def __call__(self, prompt: str = "") -> str:
+        # Stands in for input() and app.get_speech_input()
+        return self.next()
+
+
+class FakeSpeech:
+    # Stands in for SpeechFrontEnd: listen_delay of speech, then recognize_delay until the text
+    def __init__(self, script: ScriptedInput, listen_delay: float = 0.0, recognize_delay: float = 0.0):
+        self.script = script
+        self.listen_delay = listen_delay
+        self.recognize_delay = recognize_delay
+
+    def start(self) -> "FakeSpeech":
+        return self
+
+    def close(self):
+        pass
+
+    def mute(self):
+        pass
+
+    def unmute(self):
+        pass
+
+    def listen(self, timeout=None) -> Utterance:
+        time.sleep(self.listen_delay)
+        speech_end = time.perf_counter()
+        time.sleep(self.recognize_delay)
+        return Utterance(self.script.next(), self.listen_delay, speech_end, time.perf_counter())
+
+
+class FakeClient:
+    # Answers like WolframAlphaProvider.query after delay seconds
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.queries = 0
+
+    def query(self, question: str) -> RemoteResult:
+        self.queries += 1
+        if self.delay:
+            time.sleep(self.delay)
+        return RemoteResult([Pod("Result", f"Answer to {question}")])
+
+
+class SlowOfflineEngine(OfflineEngine):
+    # delay per clip, plus seconds_per_char so longer text takes longer, like a remote TTS service
+    def __init__(self, delay: float = 0.0, seconds_per_char: float = 0.0):
+        super().__init__()
+        self.delay = delay
+        self.seconds_per_char = seconds_per_char
+
+    def synthesize(self, text: str, lang: str = 'en') -> bytes:
+        seconds = self.delay + len(text) * self.seconds_per_char
+        if seconds:
+            time.sleep(seconds)
+        return super().synthesize(text, lang)
+
+
+class FakePlayer:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.played: List[str] = []
+
+    def __call__(self, audio_file: str):
+        self.played.append(audio_file)
+        if self.delay:
+            time.sleep(self.delay)
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.opened: List[str] = []
+
+    def open_new_tab(self, url: str) -> bool:
+        self.opened.append(url)
+        return True
+
+
+class FakeDevice:
+    async def open(self):
+        pass
+
+    async def command(self, command: str, timeout=None) -> str:
+        return "ok"
+
+    async def close(self):
+        pass
@@ -0,0 +1,260 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import webbrowser
+from typing import Callable, Dict, Iterator, List
+
+from benchmarks.bench_matcher import make_questions, perturb
+from benchmarks.fakes import (FakeBrowser, FakeClient, FakeDevice, FakePlayer, FakeSpeech, ScriptedInput,
+                              SlowOfflineEngine)
+from metrics import TRACER
+from prefetch import PREFETCH_INTENT
+
+# Drives yash.py, app.py and eley.py turn by turn through fakes for speech,
+# Wolfram Alpha, gTTS, playsound, the browser and the Arduino, against
+# synthetic knowledge bases, and compares the result with a stored baseline:
+#
+#   python -m benchmarks.suite                   # report, and fail on regressions
+#   python -m benchmarks.suite --save-baseline   # after an intended change
+#
+# Baselines are only comparable on the machine that recorded them.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+QUERIES_PATH = os.path.join(HERE, "fixtures", "queries.txt")
+BASELINE_PATH = os.path.join(HERE, "baselines", "default.json")
+TOLERANCE = 0.25  # Allowed slowdown before a metric counts as a regression
+# Reported but not gated: stages this fast or this rare, and p95 turn latency,
+# move by more than the tolerance from run to run on an idle machine. Below
+# the floor are mostly the fakes' own file writes (tts) and bookkeeping.
+NOISE_FLOOR_MS = 1.0
+MIN_CALLS = 20
+REPEAT = 3  # Runs per loop and size; the best of them is compared, like timeit
+
+
+def load_queries(file_path: str) -> List[str]:
+    with open(file_path, 'r') as file:
+        return [line.strip() for line in file if line.strip() and not line.startswith("#")]
+
+
+def write_knowledge_base(directory: str, size: int, rng: random.Random) -> List[str]:
+    # The shipped knowledge base, padded with generated questions up to size
+    with open(os.path.join(ROOT, "knowledge_base.json"), 'r') as file:
+        entries = json.load(file)["questions"]
+    entries += [{"question": question, "answer": f"Answer {number}"}
+                for number, question in enumerate(make_questions(max(0, size - len(entries)), rng))]
+    with open(os.path.join(directory, "knowledge_base.json"), 'w') as file:
+        json.dump({"questions": entries}, file)
+    return [entry["question"] for entry in entries]
+
+
+def make_turns(corpus: List[str], questions: List[str], turns: int, rng: random.Random) -> List[str]:
+    # Recorded queries interleaved with misheard knowledge-base questions
+    return [corpus[turn // 2 % len(corpus)] if turn % 2 == 0 else perturb(rng.choice(questions), rng).lower()
+            for turn in range(turns)]
+
+
+@contextlib.contextmanager
+def patched(target, **attributes) -> Iterator[None]:
+    # Names the target doesn't have yet (yash's input) are removed again afterwards
+    missing = object()
+    saved = {name: getattr(target, name, missing) for name in attributes}
+    for name, value in attributes.items():
+        setattr(target, name, value)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is missing:
+                delattr(target, name)
+            else:
+                setattr(target, name, value)
+
+
+def run_yash(script: ScriptedInput, args):
+    import yash
+    from response_cache import ResponseCache
+
+    # No teaching: its prompt would take the next scripted query as an answer
+    with patched(yash, input=script, client=FakeClient(args.remote_delay), query_limit=10 ** 9, teach=False,
+                 response_cache=ResponseCache("response_cache.json")), \
+            patched(webbrowser, open_new_tab=FakeBrowser().open_new_tab):
+        yash.chat_bot()
+
+
+def run_app(script: ScriptedInput, args):
+    import app
+    import semantic
+    from response_cache import ResponseCache
+    from tts import AudioCache
+
+    semantic_index = {} if args.semantic else {"load_semantic_index": lambda *options: None}
+    # Prefetching only pays off while replies play; see benchmarks/bench_prefetch.py
+    with patched(app, get_speech_input=script, client=FakeClient(args.remote_delay), QUERY_LIMIT=10 ** 9,
+                 PREFETCH=args.prefetch,
+                 response_cache=ResponseCache("response_cache.json"),
+                 audio_cache=AudioCache("audio_cache", SlowOfflineEngine(args.tts_delay)),
+                 play_audio=FakePlayer(args.playback_delay)), \
+            patched(semantic, **semantic_index), \
+            patched(webbrowser, open_new_tab=FakeBrowser().open_new_tab):
+        app.chat_bot()
+
+
+def run_eley(script: ScriptedInput, args):
+    import eley
+
+    player = FakePlayer(args.playback_delay)
+
+    class SuiteChatBot(eley.ChatBot):
+        @TRACER.traced("playback")
+        def play_audio(self, audio_file: str):
+            player(audio_file)
+
+    bot = SuiteChatBot("", 10 ** 9, "knowledge_base.json", "query_count.json", "", 0,
+                       tts_engine=SlowOfflineEngine(args.tts_delay), client=FakeClient(args.remote_delay),
+                       speech=FakeSpeech(script), device=FakeDevice())
+    with patched(webbrowser, open_new_tab=FakeBrowser().open_new_tab):
+        asyncio.run(bot.chat_bot())
+
+
+LOOPS: Dict[str, Callable] = {"yash": run_yash, "app": run_app, "eley": run_eley}
+
+
+def best_of(runs: List[dict]) -> dict:
+    stages = {}
+    for name in runs[0]["stages"]:
+        seen = [run["stages"][name] for run in runs if name in run["stages"]]
+        stages[name] = {"calls": max(stage["calls"] for stage in seen),
+                        "mean_ms": min(stage["mean_ms"] for stage in seen)}
+    return {"turns": runs[0]["turns"],
+            "turns_per_second": max(run["turns_per_second"] for run in runs),
+            "turn_p50_ms": min(run["turn_p50_ms"] for run in runs),
+            "turn_p95_ms": min(run["turn_p95_ms"] for run in runs),
+            "stages": stages}
+
+
+def measure(loop: str, size: int, corpus: List[str], args) -> dict:
+    rng = random.Random(args.seed)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        questions = write_knowledge_base(directory, size, rng)
+        script = ScriptedInput(make_turns(corpus, questions, args.turns, rng))
+        os.chdir(directory)
+        TRACER.reset()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                LOOPS[loop](script, args)
+                elapsed = time.perf_counter() - start
+        finally:
+            os.chdir(cwd)
+    latencies = sorted(script.turn_latencies)
+    stages: Dict[str, dict] = {}
+    for stage in TRACER.to_json()["stages"]:
+        if stage["intent"] == PREFETCH_INTENT:
+            continue  # Off the turn's path
+        totals = stages.setdefault(stage["stage"], {"calls": 0, "seconds": 0.0})
+        totals["calls"] += stage["count"]
+        totals["seconds"] += stage["sum"]
+    return {
+        "turns": len(latencies),
+        "turns_per_second": len(latencies) / elapsed,
+        "turn_p50_ms": statistics.median(latencies) * 1000,
+        "turn_p95_ms": latencies[int(0.95 * (len(latencies) - 1))] * 1000,
+        "stages": {name: {"calls": totals["calls"], "mean_ms": totals["seconds"] / totals["calls"] * 1000}
+                   for name, totals in sorted(stages.items())},
+    }
+
+
+def compare(key: str, name: str, value: float, previous, unit: str, tolerance: float,
+            higher_is_better: bool = False, gated: bool = True) -> List[str]:
+    # Prints one metric against its baseline and returns it if it regressed
+    if previous is None:
+        print(f"  {name:>24} {value:10.3f} {unit}")
+        return []
+    change = value / previous - 1 if previous else 0.0
+    regressed = gated and (-change if higher_is_better else change) > tolerance
+    print(f"  {name:>24} {value:10.3f} {unit}  baseline {previous:10.3f}  {change * 100:+6.1f}%"
+          f"{'  REGRESSION' if regressed else ''}")
+    return [f"{key} {name} {change * 100:+.1f}%"] if regressed else []
+
+
+def report(key: str, result: dict, baseline: dict, tolerance: float) -> List[str]:
+    print(f"{key}: {result['turns']} turns")
+    regressions = compare(key, "turns_per_second", result["turns_per_second"], baseline.get("turns_per_second"),
+                          "/s", tolerance, higher_is_better=True)
+    regressions += compare(key, "turn_p50_ms", result["turn_p50_ms"], baseline.get("turn_p50_ms"), "ms", tolerance)
+    compare(key, "turn_p95_ms", result["turn_p95_ms"], baseline.get("turn_p95_ms"), "ms", tolerance, gated=False)
+    stages = baseline.get("stages", {})
+    for name, stage in result["stages"].items():
+        previous = stages.get(name, {}).get("mean_ms")
+        regressions += compare(key, f"stage {name}", stage["mean_ms"], previous, f"ms x{stage['calls']}", tolerance,
+                               gated=min(stage["mean_ms"], previous or 0) >= NOISE_FLOOR_MS
+                               and stage["calls"] >= MIN_CALLS)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded queries through the chat loops and compare "
+                                                 "per-stage timings with a stored baseline")
+    parser.add_argument("--loops", nargs="+", choices=sorted(LOOPS), default=sorted(LOOPS))
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="knowledge base sizes, e.g. 1000000 for the largest")
+    parser.add_argument("--turns", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--queries", default=QUERIES_PATH)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--remote-delay", type=float, default=0.0, help="seconds per fake Wolfram Alpha query")
+    parser.add_argument("--tts-delay", type=float, default=0.0)
+    parser.add_argument("--playback-delay", type=float, default=0.0)
+    parser.add_argument("--semantic", action="store_true", help="build the semantic index in app.py runs")
+    parser.add_argument("--prefetch", action="store_true", help="prefetch follow-ups in app.py runs, "
+                                                                   "with --playback-delay to prefetch in")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    baselines = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, 'r') as file:
+            stored = json.load(file)
+        baselines = stored["results"]
+        if stored.get("machine") != platform.node() or stored.get("python") != platform.python_version():
+            print(f"note: baseline was recorded on {stored.get('machine')} with Python {stored.get('python')}")
+
+    corpus = load_queries(args.queries)
+    results = {}
+    regressions = []
+    for size in args.sizes:
+        for loop in args.loops:
+            key = f"{loop}/{size}"
+            results[key] = best_of([measure(loop, size, corpus, args) for _ in range(args.repeat)])
+            regressions += report(key, results[key], baselines.get(key, {}), args.tolerance)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w') as file:
+            json.dump({"machine": platform.node(), "python": platform.python_version(), "turns": args.turns,
+                       "results": results}, file, indent=2)
+        print(f"\nSaved baseline to {args.baseline}")
+    elif regressions:
+        print(f"\n{len(regressions)} regressions beyond {args.tolerance:.0%}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
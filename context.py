@@ -0,0 +1,63 @@
+import re
+from typing import Optional
+
+# The subject of a question is what follows its last "of", "is", "about"...:
+# "what is the capital of france" -> "france", "how far away is the moon" -> "the moon"
+_TOPIC = re.compile(r"^.*\b(?:of|is|are|was|were|about|in)\s+(.+?)[\s?.!]*$")
+# "what about germany", "how about the sun", "and japan"
+_SWITCH = re.compile(r"^(?:what about|how about|and)\s+(.+?)[\s?.!]*$")
+SWITCH_WORDS = 5  # Longer than this and "and ..." is a sentence of its own, not a new topic
+# Words that point back at the previous topic when they end the question: "how big is it"
+REFERENCES = frozenset({"it", "there", "that", "he", "she", "him", "her", "they", "them"})
+IDIOMS = frozenset({"what time is it", "how is it", "what is it", "who is it", "is that it"})
+# Words a question starts with; "how big is it" is resolved, "i really like her" isn't
+QUESTION_WORDS = frozenset({
+    "what", "who", "whom", "whose", "where", "when", "why", "how", "which",
+    "is", "are", "was", "were", "am", "do", "does", "did", "can", "could", "will", "would",
+    "shall", "should", "may", "might", "must", "has", "have", "had",
+})
+# A new topic is a short noun phrase; with one of these in it, "and what is 2
+# plus 2" or "and you" is a question or remark of its own
+NOT_TOPIC = REFERENCES | QUESTION_WORDS | frozenset({
+    "i", "me", "you", "we", "us", "this", "these", "those", "be", "been", "tell", "say", "said", "give", "let",
+})
+
+
+def extract_topic(question: str) -> Optional[str]:
+    found = _TOPIC.match(question.lower().strip())
+    if found is None:
+        return None
+    topic = found.group(1)
+    return None if topic in REFERENCES else topic
+
+
+def resolve_follow_up(text: str, last_question: Optional[str], topic: Optional[str]) -> str:
+    # Rewrites a follow-up into a question that stands on its own, using the
+    # previous lookup; anything else comes back unchanged
+    if not last_question or not topic:
+        return text
+    lowered = text.lower().strip()
+    switched = _SWITCH.match(lowered)
+    if switched is not None:
+        replacement = switched.group(1)
+        if not _is_topic(replacement):
+            return text
+        return _replace_topic(last_question, topic, replacement)
+    words = lowered.rstrip("?.! ").split()
+    question = lowered.endswith("?") or (words and words[0] in QUESTION_WORDS)
+    if question and len(words) > 1 and words[-1] in REFERENCES and " ".join(words) not in IDIOMS:
+        return " ".join(words[:-1] + [topic])
+    return text
+
+
+def _is_topic(phrase: str) -> bool:
+    words = re.findall(r"[\w']+", phrase)
+    return 0 < len(words) <= SWITCH_WORDS and not any(word in NOT_TOPIC for word in words)
+
+
+def _replace_topic(question: str, topic: str, replacement: str) -> str:
+    lowered = question.lower().rstrip("?.! ")
+    position = lowered.rfind(topic)
+    if position < 0:
+        return f"{lowered} {replacement}"
+    return lowered[:position] + replacement + lowered[position + len(topic):]
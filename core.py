@@ -0,0 +1,262 @@
+import logging
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import TYPE_CHECKING, Deque, NamedTuple, Optional, Tuple
+
+from context import extract_topic, resolve_follow_up
+from intents import DEFAULT_INTENTS, IntentRouter
+from knowledge_base import KnowledgeBase
+from metrics import TRACER
+from remote import RemoteError
+from response_cache import ResponseCache, query_with_cache
+from responses import (APOLOGY_RESPONSES, CONFUSED_RESPONSES, DEFAULT_EMOTION_RESPONSE, EMOTION_RESPONSES,
+                       GOODBYE_RESPONSES, JOKES, NO_ANSWER_RESPONSE, QUERY_LIMIT_RESPONSE,
+                       SEARCH_FAILED_RESPONSE, SEARCH_FOUND_RESPONSE, THANK_YOU_RESPONSES)
+from storage import QueryCounter
+
+if TYPE_CHECKING:
+    from learning import Learner
+    from semantic import SemanticIndex  # Pulls in numpy
+    from sharding import ShardedMatcher
+
+QUERY_LIMIT = 12  # Set your desired query limit
+HISTORY_LENGTH = 20
+MATCH_CACHE_SIZE = 256
+NEAR_EXACT = 0.9  # Fuzzy scores this high are a misspelling of the question, not another question
+SEMANTIC_MARGIN = 0.1  # How much closer in meaning the semantic match must be to beat the fuzzy one
+LOOKUP_INTENTS = ("knowledge_base", "remote")
+
+
+class Response(NamedTuple):
+    text: str
+    intent: str
+    url: Optional[str] = None  # Page the caller should open, for "google" requests
+    end_session: bool = False
+
+
+class Session:
+    def __init__(self, session_id: Optional[str] = None):
+        self.id = session_id or uuid.uuid4().hex
+        self.created = time.time()
+        self.last_seen = self.created
+        self.ended = False
+        self.history: Deque[Tuple[str, Response]] = deque(maxlen=HISTORY_LENGTH)
+        # The last question answered by a lookup, as looked up, and what it was about;
+        # follow-ups like "how big is it" or "what about germany" are resolved against them
+        self.last_question: Optional[str] = None
+        self.topic: Optional[str] = None
+
+    def resolve(self, text: str) -> str:
+        return resolve_follow_up(text, self.last_question, self.topic)
+
+    def record(self, text: str, response: Response, lookup_text: Optional[str] = None):
+        self.last_seen = time.time()
+        self.history.append((text, response))
+        if response.intent in LOOKUP_INTENTS:
+            self.last_question = lookup_text or text
+            self.topic = extract_topic(self.last_question) or self.topic
+        if response.end_session:
+            self.ended = True
+
+
+def google_search(query: str) -> Optional[str]:
+    try:
+        search_url = f"https://www.google.com/search?q={query}"
+        return search_url
+    except Exception as e:
+        logging.error(f"Error occurred during Google search: {e}")
+        return None
+
+
+def tell_joke() -> str:
+    return random.choice(JOKES)
+
+
+_emotion_router = IntentRouter(intent for intent in DEFAULT_INTENTS if intent.name == "emotion")
+
+
+def detect_emotion(user_input: str) -> Optional[str]:
+    found = _emotion_router.match(user_input)
+    return found.value if found else None
+
+
+def respond_to_emotion(emotion: str) -> str:
+    return EMOTION_RESPONSES.get(emotion, DEFAULT_EMOTION_RESPONSE)
+
+
+class ChatEngine:
+    # Turns one utterance into a reply. Speaking, printing and opening pages are
+    # left to the caller, so the same engine serves the voice loop and the server.
+    def __init__(self, knowledge_base: KnowledgeBase, client=None, response_cache: Optional[ResponseCache] = None,
+                 query_limit: int = QUERY_LIMIT, query_count_path: Optional[str] = None,
+                 router: Optional[IntentRouter] = None, semantic_index: Optional["SemanticIndex"] = None,
+                 match_cache_size: int = MATCH_CACHE_SIZE, learner: Optional["Learner"] = None,
+                 matcher: Optional["ShardedMatcher"] = None):
+        self.knowledge_base = knowledge_base
+        # The knowledge base's own FuzzyMatcher, or one spread over processes with the same results
+        self.matcher = matcher if matcher is not None else knowledge_base.matcher
+        # Catches rephrasings the fuzzy matcher can't ("who's my father" for "Who is my dad")
+        self.semantic_index = semantic_index
+        self._semantic_lock = threading.Lock()
+        self.router = router or IntentRouter(DEFAULT_INTENTS)
+        self.client = client
+        self.response_cache = response_cache if response_cache is not None else ResponseCache()
+        self.query_limit = query_limit
+        # Shared through query_count.json and its log, so several processes respect one limit
+        self.query_counter = QueryCounter(query_count_path)
+        # Given one, Wolfram Alpha answers are taught to the knowledge base in the background
+        self.learner = learner
+        # Recent matches, for repeated questions and the ones prefetch.py works out
+        # ahead of time. Questions are only ever added, so the size dates an entry.
+        self.match_cache_size = match_cache_size
+        self._match_cache: "OrderedDict[str, Optional[str]]" = OrderedDict()
+        self._match_cache_version = len(knowledge_base)
+        self._match_lock = threading.Lock()
+
+    @property
+    def query_count(self) -> int:
+        return self.query_counter.value
+
+    def cached_match(self, user_question: str) -> Tuple[bool, Optional[str]]:
+        with self._match_lock:
+            if self._match_cache_version != len(self.knowledge_base):
+                self._match_cache.clear()
+                self._match_cache_version = len(self.knowledge_base)
+            if user_question not in self._match_cache:
+                return False, None
+            self._match_cache.move_to_end(user_question)
+            return True, self._match_cache[user_question]
+
+    @TRACER.traced("match")
+    def find_best_match(self, user_question: str) -> Optional[str]:
+        found, best_match = self.cached_match(user_question)
+        if not found:
+            version = len(self.knowledge_base)
+            best_match = self._find_best_match(user_question)
+            with self._match_lock:
+                if self.match_cache_size and version == self._match_cache_version:
+                    self._match_cache[user_question] = best_match
+                    if len(self._match_cache) > self.match_cache_size:
+                        self._match_cache.popitem(last=False)
+        return best_match
+
+    def _find_best_match(self, user_question: str) -> Optional[str]:
+        # A question the knowledge base has is its own answer, whatever it means
+        stored = self.knowledge_base.stored_question(user_question)
+        if stored is not None:
+            return stored
+        scored = self.matcher.scored_matches(user_question, 1)
+        fuzzy_match = scored[0][1] if scored else None
+        if self.semantic_index is None or (scored and scored[0][0] >= NEAR_EXACT):
+            return fuzzy_match
+        with self._semantic_lock:
+            # Questions taught since the index was built
+            indexed = len(self.semantic_index)
+            if indexed < len(self.knowledge_base):
+                self.semantic_index.extend(self.knowledge_base.questions[indexed:])
+        semantic_match = self.semantic_index.best_match(user_question)
+        if semantic_match is None or fuzzy_match is None or semantic_match == fuzzy_match:
+            return semantic_match or fuzzy_match
+        # Meaning only overrules spelling by a clear margin: "who's my father" is
+        # closer to "Who is my mother" than to "Who is my dad" letter by letter,
+        # but "hey" means "Hey" and "hello" alike and stays with "Hey".
+        if (self.semantic_index.similarity(user_question, semantic_match)
+                >= self.semantic_index.similarity(user_question, fuzzy_match) + SEMANTIC_MARGIN):
+            return semantic_match
+        return fuzzy_match
+
+    @TRACER.traced("remote")
+    def query_remote(self, question: str) -> Optional[str]:
+        if self.client is None:
+            return None
+        # Cached answers don't use up the query limit
+        if question not in self.response_cache:
+            if self.query_counter.try_increment(self.query_limit) is None:
+                return QUERY_LIMIT_RESPONSE
+        try:
+            return query_with_cache(self.client, question, self.response_cache)
+        except RemoteError as e:
+            # Timeouts, rate limiting and outages; the caller falls back to its default reply
+            logging.warning(f"No answer from Wolfram Alpha: {e}")
+            return None
+        except Exception:
+            logging.exception(f"Unexpected error answering {question!r}")
+            return None
+
+    @TRACER.traced("answer")
+    def get_answer_for_question(self, question: str) -> Optional[str]:
+        answer = self.knowledge_base.get_answer(question)
+        if answer is not None:
+            return answer
+        return self.query_remote(question)
+
+    def lookup(self, text: str) -> Tuple[Optional[str], str]:
+        best_match = self.find_best_match(text)
+        if best_match:
+            return self.get_answer_for_question(best_match), "knowledge_base"
+        answer = self.query_remote(text)
+        if answer == QUERY_LIMIT_RESPONSE:
+            return answer, "query_limit"
+        if answer and self.learner is not None:
+            self.learner.learn(text, answer)
+        return answer, "remote"
+
+    def search(self, query: str) -> Response:
+        search_url = google_search(query)
+        if search_url:
+            return Response(SEARCH_FOUND_RESPONSE, "google", url=search_url)
+        return Response(SEARCH_FAILED_RESPONSE, "google")
+
+    def answer(self, text: str) -> Response:
+        # Text-mode routing of yash.py: a web search or a knowledge lookup, nothing else
+        lowered = text.lower()
+        if "search up" in lowered:
+            return self.search(lowered.replace("search up", "").strip())
+        answer, intent = self.lookup(text)
+        if answer:
+            return Response(answer, intent)
+        return Response(NO_ANSWER_RESPONSE, "unanswered")
+
+    def respond(self, text: str, session: Optional[Session] = None) -> Response:
+        # Intents see what was said; lookups see it resolved against the session
+        lookup_text = session.resolve(text) if session is not None else text
+        response = self._route(text, lookup_text)
+        if response.intent == "confused" and lookup_text != text:
+            # Nothing for the follow-up as resolved; the words as said may still be a
+            # knowledge-base question. Not a second remote query: the turn had its one.
+            best_match = self.find_best_match(text)
+            answer = self.knowledge_base.get_answer(best_match) if best_match else None
+            if answer is not None:
+                lookup_text = text
+                response = Response(answer, "knowledge_base")
+        TRACER.set_intent(response.intent)
+        if session is not None:
+            session.record(text, response, lookup_text)
+        return response
+
+    def _route(self, text: str, lookup_text: Optional[str] = None) -> Response:
+        intent = self.router.match(text)
+        name = intent.name if intent else None
+
+        if name == "quit":
+            return Response(random.choice(GOODBYE_RESPONSES), "quit", end_session=True)
+        if name == "thanks":
+            return Response(random.choice(THANK_YOU_RESPONSES), "thanks")
+        if name == "offensive":
+            return Response(random.choice(APOLOGY_RESPONSES), "offensive")
+        if name == "emotion":
+            return Response(respond_to_emotion(intent.value), "emotion")
+        if name == "google":
+            return self.search(text.lower().replace("google", "").strip())
+        if name == "joke":
+            return Response(tell_joke(), "joke")
+        if intent and intent.responses:
+            return Response(random.choice(intent.responses), name)
+
+        answer, intent_name = self.lookup(lookup_text or text)
+        if answer:
+            return Response(answer, intent_name)
+        return Response(random.choice(CONFUSED_RESPONSES), "confused")
@@ -0,0 +1,196 @@
+import asyncio
+import itertools
+import logging
+import os
+import statistics
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+READY_LINE = "READY"  # Printed by the sketch at the end of setup()
+READY_TIMEOUT = 2.5  # Firmware that never says READY waits about as long as the old fixed sleep
+POLL_TIMEOUT = 0.1  # Read timeout of the reader thread, and so how long close() waits for it
+COMMAND_TIMEOUT = 3
+LATENCY_SAMPLES = 1000
+
+
+class DeviceError(Exception):
+    pass
+
+
+class SerialDevice:
+    # Line-based command channel to the Arduino. A background task reads reply
+    # lines as they arrive and resolves the matching command, so several commands
+    # can be in flight at once and the event loop never blocks on readline().
+    # Plain firmware answers in order, one line per command; with tagged=True each
+    # command goes out as "#<id> <command>" and the reply "#<id> <text>" may come
+    # back in any order. Plain firmware that answers after the command timed out
+    # has its late reply taken for the next command's; use tagged firmware then.
+    def __init__(self, port: str, baud_rate: int = 9600, ready_line: str = READY_LINE,
+                 ready_timeout: float = READY_TIMEOUT, command_timeout: float = COMMAND_TIMEOUT,
+                 tagged: bool = False):
+        self.port = port
+        self.baud_rate = baud_rate
+        self.ready_line = ready_line
+        self.ready_timeout = ready_timeout
+        self.command_timeout = command_timeout
+        self.tagged = tagged
+        self.latencies: Dict[str, Deque[float]] = {}
+        self.connection = None
+        self._ids = itertools.count(1)
+        self._pending: Deque[asyncio.Future] = deque()
+        self._tagged: Dict[str, asyncio.Future] = {}
+        self._ready: Optional[asyncio.Event] = None
+        self._ready_task: Optional[asyncio.Task] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._transport: Optional[asyncio.ReadTransport] = None
+        self._reader_thread: Optional[threading.Thread] = None
+        self._closing = False
+        self._opened_at = 0.0
+
+    async def open(self):
+        # Returns as soon as the port is open; commands wait for the READY line,
+        # so the board's reset overlaps whatever the caller does next.
+        import serial
+
+        loop = asyncio.get_running_loop()
+        self._opened_at = time.perf_counter()
+        self.connection = await asyncio.to_thread(serial.Serial, self.port, self.baud_rate, timeout=0)
+        self.connection.reset_input_buffer()
+        self._closing = False
+        reader = asyncio.StreamReader()
+        if os.name != 'nt' and hasattr(self.connection, "fileno"):
+            self._transport, _ = await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader),
+                                                              os.fdopen(os.dup(self.connection.fileno()), 'rb', 0))
+        else:
+            # pyserial on Windows has no fileno() and the Proactor loop can't read a
+            # COM port, so a thread blocks on the port and feeds the same reader
+            self.connection.timeout = POLL_TIMEOUT
+            self._reader_thread = threading.Thread(target=self._read_port, args=(reader, loop),
+                                                   name="serial-reader", daemon=True)
+            self._reader_thread.start()
+        self._ready = asyncio.Event()
+        self._reader_task = asyncio.create_task(self._read_lines(reader))
+        self._ready_task = asyncio.create_task(self._ready_or_timeout())
+
+    def _read_port(self, reader: asyncio.StreamReader, loop: asyncio.AbstractEventLoop):
+        try:
+            while not self._closing:
+                data = self.connection.read(self.connection.in_waiting or 1)
+                if data:
+                    loop.call_soon_threadsafe(reader.feed_data, data)
+        except Exception as e:  # serial.SerialException, or the port closed under the read
+            if not self._closing:
+                logging.error(f"Arduino connection lost: {e}")
+        finally:
+            try:
+                loop.call_soon_threadsafe(reader.feed_eof)
+            except RuntimeError:
+                pass  # The loop is already closed
+
+    async def _ready_or_timeout(self):
+        try:
+            await asyncio.wait_for(self._ready.wait(), self.ready_timeout)
+            logging.info(f"Arduino ready after {time.perf_counter() - self._opened_at:.2f}s")
+        except asyncio.TimeoutError:
+            logging.info(f"No {self.ready_line} from the Arduino after {self.ready_timeout}s, sending commands anyway")
+            self._ready.set()
+
+    async def wait_ready(self):
+        if self._ready is None:
+            raise DeviceError("Device is not open")
+        await self._ready.wait()
+
+    async def _read_lines(self, reader: asyncio.StreamReader):
+        try:
+            while True:
+                raw = await reader.readline()
+                if not raw:
+                    break
+                self._dispatch(raw.decode(errors='replace').strip())
+        except (OSError, ValueError) as e:
+            logging.error(f"Arduino connection lost: {e}")
+        finally:
+            self._fail_pending(DeviceError("Arduino connection closed"))
+
+    def _dispatch(self, line: str):
+        if not line:
+            return
+        if not self._ready.is_set():
+            if line == self.ready_line:
+                self._ready.set()
+            return  # Boot chatter before READY answers nothing
+        if self.tagged and line.startswith("#"):
+            tag, _, text = line[1:].partition(" ")
+            future = self._tagged.pop(tag, None)
+            if future is not None and not future.done():
+                future.set_result(text)
+            return
+        if not self._pending:
+            logging.warning(f"Unexpected line from the Arduino: {line!r}")
+            return
+        future = self._pending.popleft()
+        if not future.done():
+            future.set_result(line)
+
+    def _fail_pending(self, error: Exception):
+        for future in itertools.chain(self._pending, self._tagged.values()):
+            if not future.done():
+                future.set_exception(error)
+        self._pending.clear()
+        self._tagged.clear()
+
+    async def command(self, command: str, timeout: Optional[float] = None) -> str:
+        await self.wait_ready()
+        if self._reader_task is None or self._reader_task.done():
+            raise DeviceError("Arduino connection closed")
+        future = asyncio.get_running_loop().create_future()
+        if self.tagged:
+            tag = str(next(self._ids))
+            self._tagged[tag] = future
+            line = f"#{tag} {command}\n"
+        else:
+            self._pending.append(future)
+            line = f"{command}\n"
+        started = time.perf_counter()
+        # A few bytes fit in the driver's buffer, so this write doesn't wait on the device
+        self.connection.write(line.encode())
+        try:
+            response = await asyncio.wait_for(asyncio.shield(future), timeout or self.command_timeout)
+        except asyncio.TimeoutError:
+            future.cancel()
+            if self.tagged:
+                self._tagged.pop(tag, None)
+            elif future in self._pending:
+                # The reply may never come, and a slot kept for it would hand every
+                # later reply to the command before; whatever half arrived is dropped
+                self._pending.remove(future)
+                if not self._pending:
+                    self.connection.reset_input_buffer()
+            raise
+        self.latencies.setdefault(command, deque(maxlen=LATENCY_SAMPLES)).append(time.perf_counter() - started)
+        return response
+
+    def latency_stats(self) -> Dict[str, Dict[str, float]]:
+        stats = {}
+        for command, samples in self.latencies.items():
+            ordered = sorted(samples)
+            stats[command] = {"count": len(ordered), "mean": statistics.fmean(ordered),
+                              "p50": ordered[len(ordered) // 2], "p95": ordered[int(len(ordered) * 0.95)],
+                              "max": ordered[-1]}
+        return stats
+
+    async def close(self):
+        for task in (self._ready_task, self._reader_task):
+            if task is not None and not task.done():
+                task.cancel()
+        self._closing = True
+        if self._transport is not None:
+            self._transport.close()
+        if self._reader_thread is not None:
+            await asyncio.to_thread(self._reader_thread.join, POLL_TIMEOUT * 2)
+            self._reader_thread = None
+        if self.connection is not None:
+            self.connection.close()
+        self._fail_pending(DeviceError("Arduino connection closed"))
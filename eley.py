@@ -1,98 +1,88 @@
-import json
-import os
 import logging
 import asyncio
-import serial
+import os
 import time
-import wolframalpha
-import speech_recognition as sr
-from difflib import get_close_matches
-from gtts import gTTS
-import playsound
-import webbrowser
-from typing import List, Optional, Dict
+from typing import Callable, List, Optional
+from core import ChatEngine
+from device import DeviceError, SerialDevice
+from intents import DEVICE_INTENTS, IntentRouter
+from knowledge_base import KnowledgeBase
+from metrics import TRACER
+from remote import APP_ID_ENV, WolframAlphaProvider
+from response_cache import ResponseCache
+from speech import MAX_UTTERANCE, MicrophoneSource, RecognitionError, SpeechFrontEnd, make_backend
+from storage import KnowledgeBaseStore
+from tts import AudioCache, TTSEngine, split_sentences
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 # Wolfram Alpha API setup
-APP_ID = 'TTTH2G-K83HXKUXRH'  # Replace with your Wolfram Alpha App ID
-client = wolframalpha.Client(APP_ID)
+APP_ID = os.environ.get(APP_ID_ENV, "")  # Your Wolfram Alpha App ID
 QUERY_LIMIT = 100  # Set your desired query limit
 
 # Arduino Serial Port Setup
 ARDUINO_PORT = '/dev/ttyUSB0'  # Replace with your Arduino serial port
 BAUD_RATE = 9600
 
+# Timeouts (seconds) for each blocking stage of a turn
+LISTEN_TIMEOUT = 30
+RECOGNIZE_TIMEOUT = 10
+QUERY_TIMEOUT = 15
+TTS_TIMEOUT = 15
+PLAYBACK_TIMEOUT = 120
+BROWSER_TIMEOUT = 5
+SERIAL_TIMEOUT = 3
+
+SPEECH_BACKEND = "google"  # "vosk" recognizes offline and while you speak
+
+METRICS_PATH = "metrics.json"  # Stage timings, written when the chat ends
+
 class ChatBot:
-    def __init__(self, app_id: str, query_limit: int, knowledge_base_path: str, query_count_path: str, arduino_port: str, baud_rate: int):
-        self.client = wolframalpha.Client(app_id)
-        self.query_limit = query_limit
-        self.knowledge_base_path = knowledge_base_path
-        self.query_count_path = query_count_path
+    def __init__(self, app_id: str, query_limit: int, knowledge_base_path: str, query_count_path: str, arduino_port: str, baud_rate: int, response_cache_path: str = "response_cache.json", tts_engine: Optional[TTSEngine] = None,
+                 client=None, speech: Optional[SpeechFrontEnd] = None, device=None, overlap_speech: bool = False):
+        self.knowledge_store = KnowledgeBaseStore(knowledge_base_path)
         self.knowledge_base = self.load_knowledge_base()
-        self.query_count = self.load_query_count()
-        self.serial_connection = serial.Serial(arduino_port, baud_rate, timeout=1)
-        time.sleep(2)  # Wait for the serial connection to initialize
+        # Matching, the query limit and Wolfram Alpha answers work as in app.py and the server
+        self.engine = ChatEngine(self.knowledge_base, client or WolframAlphaProvider(app_id),
+                                 ResponseCache(response_cache_path), query_limit, query_count_path,
+                                 IntentRouter(DEVICE_INTENTS))
+        self.router = self.engine.router
+        self.audio_cache = AudioCache(engine=tts_engine)
+        # Opened in chat_bot() and kept for the session, along with its VAD's noise estimate
+        self.speech = speech
+        # Listen for turn N+1 while turn N is spoken; the microphone is muted
+        # while audio plays either way, so only the recognizer gets a head start
+        self.overlap_speech = overlap_speech
+        self.turn_latencies: List[float] = []
+        self.first_audio_latencies: List[float] = []
+        self._speech_task: Optional[asyncio.Task] = None
+        # Opened in chat_bot(); commands wait for the board's READY line instead of a fixed sleep
+        self.device = device or SerialDevice(arduino_port, baud_rate)
+
+    async def run_blocking(self, func: Callable, *args, timeout: float, default=None):
+        # Blocking calls run in a worker thread so the event loop stays free. A
+        # thread can't be interrupted, so on timeout its result is simply dropped.
+        try:
+            return await asyncio.wait_for(asyncio.to_thread(func, *args), timeout)
+        except asyncio.TimeoutError:
+            logging.error(f"{func.__name__} timed out after {timeout}s")
+            return default
 
+    @TRACER.traced("playback")
     def play_audio(self, audio_file: str):
+        import playsound  # Imported on first use, as in app.py
         playsound.playsound(audio_file)
 
-    def load_knowledge_base(self) -> Dict:
-        if os.path.exists(self.knowledge_base_path):
-            with open(self.knowledge_base_path, 'r') as file:
-                return json.load(file)
-        else:
-            return {"questions": []}
+    def load_knowledge_base(self) -> KnowledgeBase:
+        return self.knowledge_store.load()
 
     def save_knowledge_base(self):
-        with open(self.knowledge_base_path, 'w') as file:
-            json.dump(self.knowledge_base, file, indent=2)
-
-    def load_query_count(self) -> int:
-        if os.path.exists(self.query_count_path):
-            with open(self.query_count_path, 'r') as file:
-                data = json.load(file)
-                return data.get("query_count", 0)
-        else:
-            return 0
+        self.knowledge_store.compact()
 
-    def save_query_count(self):
-        with open(self.query_count_path, 'w') as file:
-            json.dump({"query_count": self.query_count}, file, indent=2)
-
-    def find_best_match(self, user_question: str, questions: List[str]) -> Optional[str]:
-        # Ensure that questions is a list of strings
-        if not all(isinstance(q, str) for q in questions):
-            logging.error("The questions list must contain only strings.")
-            return None
-        
-        if not isinstance(user_question, str):
-            logging.error("User question must be a string.")
-            return None
-        
-        matches = get_close_matches(user_question, questions, n=1, cutoff=0.6)
-        if matches:
-            logging.info(f"Best match found: {matches[0]}")
-            return matches[0]
-        else:
-            logging.info("No match found.")
-            return None
-
-    def get_answer_for_question(self, question: str) -> Optional[str]:
-        for q in self.knowledge_base["questions"]:
-            if q["question"] == question:
-                return q["answer"]
-
-        if self.query_count < self.query_limit:
-            res = self.client.query(question)
-            try:
-                answer = next(res.results).text
-                return answer
-            except StopIteration:
-                return None
-        else:
-            return "Query limit reached. Please try again later."
+    @property
+    def query_count(self) -> int:
+        return self.engine.query_count
 
     async def google_search(self, query: str) -> Optional[str]:
         try:
@@ -105,87 +95,145 @@ class ChatBot:
     async def open_google_search(self, query: str) -> str:
         search_url = await self.google_search(query)
         if search_url:
-            webbrowser.open_new_tab(search_url)
+            import webbrowser
+            await self.run_blocking(webbrowser.open_new_tab, search_url, timeout=BROWSER_TIMEOUT)
             return "I found this information online."
         else:
             return "Sorry, I couldn't perform the Google search."
 
+    @TRACER.traced("listen")
     async def get_speech_input(self) -> str:
-        recognizer = sr.Recognizer()
-        with sr.Microphone() as source:
-            logging.info("ELEY: Listening...")
-            audio = recognizer.listen(source)
-            try:
-                user_input = recognizer.recognize_google(audio)
-                logging.info(f"You: {user_input}")
-                return user_input.lower()
-            except sr.UnknownValueError:
-                logging.warning("ELEY: Sorry, I did not understand that.")
-                return ""
-            except sr.RequestError:
-                logging.error("ELEY: Could not request results from the recognizer service.")
-                return ""
-
-    def text_to_speech(self, text: str, file_name: str):
-        tts = gTTS(text=text, lang='en')
-        tts.save(file_name)
-
-    def send_command_to_arduino(self, command: str):
-        self.serial_connection.write((command + '\n').encode())
-        response = self.serial_connection.readline().decode().strip()
+        logging.info("ELEY: Listening...")
+        try:
+            # LISTEN_TIMEOUT is for the user to start talking; recognition overlaps the speech itself
+            utterance = await self.run_blocking(self.speech.listen, LISTEN_TIMEOUT,
+                                                timeout=LISTEN_TIMEOUT + MAX_UTTERANCE + RECOGNIZE_TIMEOUT)
+        except RecognitionError:
+            logging.error("ELEY: Could not request results from the recognizer service.")
+            return ""
+        if utterance is None:
+            return ""
+        if not utterance.text:
+            logging.warning("ELEY: Sorry, I did not understand that.")
+            return ""
+        TRACER.record("recognize", utterance.latency)
+        logging.info(f"You: {utterance.text}")
+        return utterance.text.lower()
+
+    @TRACER.traced("tts")
+    def text_to_speech(self, text: str) -> str:
+        return self.audio_cache.get_path(text)
+
+    async def speak(self, text: str, started: float):
+        # Every sentence is synthesized concurrently; the first plays as soon as it's ready
+        synthesis_started = time.perf_counter()
+        chunks = [asyncio.create_task(self.run_blocking(self.text_to_speech, chunk, timeout=TTS_TIMEOUT))
+                  for chunk in split_sentences(text)]
+        try:
+            for position, chunk in enumerate(chunks):
+                audio_file = await chunk
+                if position == 0:
+                    now = time.perf_counter()
+                    self.turn_latencies.append(now - started)
+                    self.first_audio_latencies.append(now - synthesis_started)
+                    TRACER.record("first_audio", now - synthesis_started)
+                    logging.info(f"Time to first audio: {(now - synthesis_started) * 1000:.0f} ms")
+                if audio_file:
+                    self.speech.mute()  # Or ELEY's own voice would be heard as the next turn
+                    try:
+                        await self.run_blocking(self.play_audio, audio_file, timeout=PLAYBACK_TIMEOUT)
+                    finally:
+                        self.speech.unmute()
+        finally:
+            for chunk in chunks:
+                chunk.cancel()
+
+    async def finish_speaking(self):
+        if self._speech_task is not None:
+            await self._speech_task
+            self._speech_task = None
+
+    async def say(self, text: Optional[str], started: float):
+        # Replies stay in order: the previous one finishes before this one starts
+        await self.finish_speaking()
+        if not text:
+            return
+        self._speech_task = asyncio.create_task(self.speak(text, started))
+        if not self.overlap_speech:
+            await self.finish_speaking()
+
+    @TRACER.traced("device")
+    async def send_command_to_arduino(self, command: str) -> str:
+        try:
+            response = await self.device.command(command, SERIAL_TIMEOUT)
+        except asyncio.TimeoutError:
+            logging.error(f"Arduino didn't answer {command} within {SERIAL_TIMEOUT}s")
+            return ""
+        except DeviceError as e:
+            logging.error(f"Arduino command {command} failed: {e}")
+            return ""
         logging.info(f"Arduino response: {response}")
         return response
 
     async def chat_bot(self):
+        if self.speech is None:
+            self.speech = SpeechFrontEnd(MicrophoneSource(), make_backend(SPEECH_BACKEND))
+        self.speech.start()
+        await self.device.open()
+        try:
+            await self.run_turns()
+            await self.finish_speaking()
+        finally:
+            if self._speech_task is not None and not self._speech_task.done():
+                self._speech_task.cancel()
+            await self.device.close()
+            self.speech.close()
+            TRACER.write_json(METRICS_PATH)
+
+    async def run_turns(self):
         while True:
-            user_input = await self.get_speech_input()
-
-            if user_input == 'quit':
-                self.text_to_speech("Goodbye!", "response.mp3")
-                self.play_audio("response.mp3")
-                break
-
-            if "thank you" in user_input:
-                self.text_to_speech("You're welcome!", "response.mp3")
-                self.play_audio("response.mp3")
-                break
-
-            if user_input.startswith("google"):
-                search_query = user_input.replace("google", "").strip()
-                google_result = await self.open_google_search(search_query)
-                logging.info(f'ELEY: {google_result}')
-                self.text_to_speech(google_result, "response.mp3")
-                self.play_audio("response.mp3")
-            elif "turn on" in user_input:
-                arduino_response = self.send_command_to_arduino("turn_on")
-                self.text_to_speech(arduino_response, "response.mp3")
-                self.play_audio("response.mp3")
-            elif "turn off" in user_input:
-                arduino_response = self.send_command_to_arduino("turn_off")
-                self.text_to_speech(arduino_response, "response.mp3")
-                self.play_audio("response.mp3")
-            else:
-                best_match = self.find_best_match(user_input, [q["question"] for q in self.knowledge_base["questions"]])
-
-                if best_match:
-                    answer = self.get_answer_for_question(best_match)
-                    logging.info(f'ELEY: {answer}')
-                    self.text_to_speech(answer, "response.mp3")
-                    self.play_audio("response.mp3")
+            with TRACER.turn():
+                user_input = await self.get_speech_input()
+                if not user_input:
+                    continue  # Nobody spoke before LISTEN_TIMEOUT, or nothing was understood
+                started = time.perf_counter()
+                intent = self.router.match(user_input)
+                name = intent.name if intent else None
+                TRACER.set_intent(name or "unanswered")
+
+                if name == "quit":
+                    await self.say("Goodbye!", started)
+                    break
+
+                if name == "thanks":
+                    await self.say("You're welcome!", started)
+                    break
+
+                if name == "google":
+                    search_query = user_input.replace("google", "").strip()
+                    google_result = await self.open_google_search(search_query)
+                    logging.info(f'ELEY: {google_result}')
+                    await self.say(google_result, started)
+                elif name == "turn_on":
+                    arduino_response = await self.send_command_to_arduino("turn_on")
+                    await self.say(arduino_response, started)
+                elif name == "turn_off":
+                    arduino_response = await self.send_command_to_arduino("turn_off")
+                    await self.say(arduino_response, started)
                 else:
                     logging.info('ELEY: Loading...')
-                    answer = self.get_answer_for_question(user_input)
+                    answer, lookup_intent = await self.run_blocking(self.engine.lookup, user_input,
+                                                                    timeout=QUERY_TIMEOUT, default=(None, "remote"))
                     if answer:
+                        TRACER.set_intent(lookup_intent)
                         logging.info(f'ELEY: {answer}')
-                        self.text_to_speech(answer, "response.mp3")
-                        self.play_audio("response.mp3")
-                        self.query_count += 1
-                        self.save_query_count()
+                        await self.say(answer, started)
                     else:
                         logging.info('ELEY: Sorry, I couldn\'t find an answer for that.')
-                        self.text_to_speech("Sorry, I couldn't find an answer for that.", "response.mp3")
-                        self.play_audio("response.mp3")
+                        await self.say("Sorry, I couldn't find an answer for that.", started)
 
 if __name__ == '__main__':
+    if not APP_ID:
+        logging.warning(f"{APP_ID_ENV} is not set; questions the knowledge base can't answer will go unanswered")
     bot = ChatBot(APP_ID, QUERY_LIMIT, "knowledge_base.json", "query_count.json", ARDUINO_PORT, BAUD_RATE)
     asyncio.run(bot.chat_bot())
@@ -0,0 +1,122 @@
+import json
+import os
+import re
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+OFFENSIVE_WORDS = ["mean", "swear", "offensive", "badword", "insult"]  # Example offensive words list
+
+EMOTIONS_KEYWORDS = {
+    "sad": ["sad", "unhappy", "depressed"],
+    "bored": ["bored", "boring", "uninterested"],
+    "happy": ["happy", "joy", "glad"]
+}
+
+CONTAINS = "contains"  # phrase anywhere in the input, on word boundaries
+EXACT = "exact"  # the whole input
+PREFIX = "prefix"  # the input starts with the phrase
+
+
+class Intent(NamedTuple):
+    name: str
+    phrases: Tuple[str, ...]
+    priority: int
+    match: str = CONTAINS
+    value: Optional[str] = None  # Extra detail for the handler, e.g. which emotion
+    responses: Tuple[str, ...] = ()  # Canned replies for intents added from config
+
+
+class IntentMatch(NamedTuple):
+    name: str
+    value: Optional[str]
+    phrase: str
+    responses: Tuple[str, ...]
+
+
+# Same order the chat loops have always checked these in
+DEFAULT_INTENTS = [
+    Intent("quit", ("quit",), 10, EXACT),
+    Intent("thanks", ("thank you",), 20),
+    Intent("offensive", tuple(OFFENSIVE_WORDS), 30),
+    *(Intent("emotion", tuple(keywords), 40 + position, value=emotion)
+      for position, (emotion, keywords) in enumerate(EMOTIONS_KEYWORDS.items())),
+    Intent("google", ("google",), 50, PREFIX),
+    Intent("joke", ("joke", "jokes"), 60),
+]
+
+DEVICE_INTENTS = [
+    Intent("quit", ("quit",), 10, EXACT),
+    Intent("thanks", ("thank you",), 20),
+    Intent("google", ("google",), 50, PREFIX),
+    Intent("turn_on", ("turn on",), 70),
+    Intent("turn_off", ("turn off",), 80),
+]
+
+CONFIG_PRIORITY = 100  # Intents from config rank after the built-in ones unless they say otherwise
+
+
+_WORD = re.compile(r"\w+")
+_PUNCTUATION = re.compile(r"[^\w\s]")
+
+
+def tokenize(text: str) -> List[str]:
+    # Recognized speech has no punctuation, so the plain split is the usual path
+    lowered = text.lower()
+    if _PUNCTUATION.search(lowered) is None:
+        return lowered.split()
+    return _WORD.findall(lowered)
+
+
+class IntentRouter:
+    # Phrases are indexed by their first word, so one pass over the words of the
+    # input finds every phrase that occurs in it. Candidates are kept in priority
+    # order, which lets the scan skip anything that can no longer beat the best
+    # match so far. Matching whole words is what gives word boundaries.
+    def __init__(self, intents: Iterable[Intent]):
+        self.intents: List[Intent] = sorted(intents, key=lambda intent: intent.priority)
+        self._index: Dict[str, List[Tuple[int, Tuple[str, ...], str, IntentMatch]]] = {}
+        for position, intent in enumerate(self.intents):
+            if intent.match not in (CONTAINS, EXACT, PREFIX):
+                raise ValueError(f"Unknown match type for intent {intent.name!r}: {intent.match!r}")
+            for phrase in intent.phrases:
+                words = tuple(tokenize(phrase))
+                if words:
+                    found = IntentMatch(intent.name, intent.value, " ".join(words), intent.responses)
+                    self._index.setdefault(words[0], []).append((position, words, intent.match, found))
+        for candidates in self._index.values():
+            candidates.sort(key=lambda candidate: (candidate[0], -len(candidate[1])))
+
+    def match(self, text: str) -> Optional[IntentMatch]:
+        tokens = tokenize(text)
+        if self._index.keys().isdisjoint(tokens):
+            return None
+        best_position = len(self.intents)
+        best = None
+        for start, token in enumerate(tokens):
+            candidates = self._index.get(token)
+            if candidates is None:
+                continue
+            for position, words, match, found in candidates:
+                if position >= best_position:
+                    break
+                end = start + len(words)
+                if match != CONTAINS and start != 0 or match == EXACT and end != len(tokens):
+                    continue
+                if len(words) == 1 or tuple(tokens[start:end]) == words:
+                    best_position, best = position, found
+                    break
+            if best_position == 0:
+                break
+        return best
+
+
+def load_intents(file_path: str, base: Sequence[Intent] = DEFAULT_INTENTS) -> List[Intent]:
+    # A JSON list of {"name", "phrases", "match"?, "priority"?, "value"?, "responses"?}
+    # objects; they are added to the built-in table.
+    intents = list(base)
+    if os.path.exists(file_path):
+        with open(file_path, 'r') as file:
+            for entry in json.load(file):
+                intents.append(Intent(entry["name"], tuple(entry["phrases"]), entry.get("priority", CONFIG_PRIORITY),
+                                      entry.get("match", CONTAINS), entry.get("value"),
+                                      tuple(entry.get("responses", ()))))
+    return intents
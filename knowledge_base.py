@@ -0,0 +1,185 @@
+import json
+import mmap
+import os
+import sys
+import tempfile
+import unicodedata
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from matcher import FuzzyMatcher
+
+
+def normalize_question(question: str, fold_case: bool = False, fold_punctuation: bool = False) -> str:
+    if fold_case:
+        question = question.casefold()
+    if fold_punctuation:
+        question = "".join(char for char in question if not unicodedata.category(char).startswith("P"))
+        question = " ".join(question.split())
+    return question
+
+
+class AnswerStore:
+    # Every answer as UTF-8 in one buffer, found through an offset and a length
+    # per entry: 12 bytes of bookkeeping per answer instead of a str object.
+    # map_file() moves the buffer into a file mapped with mmap, so the answers
+    # sit in the page cache rather than on the heap; later answers are appended
+    # in memory after the mapped part. Replaced answers are kept as strings on
+    # the side, so a reader never sees an offset and a length that don't match.
+    def __init__(self):
+        self.buffer = bytearray()
+        self.offsets = array('Q')
+        self.lengths = array('I')
+        self.replaced: Dict[int, str] = {}
+        self.mapped: Optional[mmap.mmap] = None
+        self.mapped_path: Optional[str] = None
+        self.mapped_size = 0
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __getitem__(self, position: int) -> str:
+        if self.replaced:
+            answer = self.replaced.get(position)
+            if answer is not None:
+                return answer
+        offset = self.offsets[position]
+        end = offset + self.lengths[position]
+        if offset < self.mapped_size:
+            return self.mapped[offset:end].decode('utf-8')
+        return self.buffer[offset - self.mapped_size:end - self.mapped_size].decode('utf-8')
+
+    def append(self, answer: str):
+        # The offset goes last: it is what makes the new answer visible to readers
+        encoded = answer.encode('utf-8')
+        offset = self.mapped_size + len(self.buffer)
+        self.buffer += encoded
+        self.lengths.append(len(encoded))
+        self.offsets.append(offset)
+
+    def replace(self, position: int, answer: str):
+        self.replaced[position] = answer
+
+    def extend(self, answers: Iterable[str]):
+        # Repeated answers are stored once and shared
+        first: Dict[str, int] = {}
+        for answer in answers:
+            position = first.get(answer)
+            if position is None:
+                first[answer] = len(self.offsets)
+                self.append(answer)
+            else:
+                self.offsets.append(self.offsets[position])
+                self.lengths.append(self.lengths[position])
+
+    def map_file(self, file_path: str):
+        directory = os.path.dirname(os.path.abspath(file_path))
+        with tempfile.NamedTemporaryFile('wb', dir=directory, delete=False, suffix='.tmp') as file:
+            if self.mapped is not None:
+                file.write(self.mapped)
+            file.write(self.buffer)
+        os.replace(file.name, file_path)
+        self._map(file_path, os.path.getsize(file_path))
+        self.buffer = bytearray()
+
+    def _map(self, file_path: str, size: int):
+        if os.path.getsize(file_path) != size:
+            raise ValueError(f"{file_path} has changed since the knowledge base was built")
+        with open(file_path, 'rb') as file:
+            # mmap can't map an empty file
+            self.mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self.mapped_path = file_path
+        self.mapped_size = size
+
+    def __getstate__(self) -> dict:
+        # Pickled (in storage snapshots) by path; the file is mapped again on load
+        state = self.__dict__.copy()
+        state["mapped"] = None
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        if self.mapped_path is not None:
+            self._map(self.mapped_path, self.mapped_size)
+
+
+class KnowledgeBase:
+    # Entries are stored by column instead of as one dict per entry: questions as
+    # interned strings (shared with the matcher and the lookup index) and answers
+    # in an AnswerStore. {"questions": [{"question", "answer"}, ...]} JSON stays
+    # the import/export format; other top-level keys (the storage sequence
+    # number) are kept in data. With answers_path, answers are mmap-backed.
+    def __init__(self, data: Optional[dict] = None, fold_case: bool = False, fold_punctuation: bool = False,
+                 answers_path: Optional[str] = None):
+        data = data if data is not None else {"questions": []}
+        self.data = {key: value for key, value in data.items() if key != "questions"}
+        self.fold_case = fold_case
+        self.fold_punctuation = fold_punctuation
+        self.matcher = FuzzyMatcher()
+        self._questions: List[str] = []
+        self._answers = AnswerStore()
+        self._index: Dict[str, int] = {}
+        entries = data.get("questions", [])
+        for entry in entries:
+            self._add_question(entry["question"])
+        self._answers.extend(entry["answer"] for entry in entries)
+        if answers_path is not None:
+            self._answers.map_file(answers_path)
+
+    @classmethod
+    def load(cls, file_path: str, **options) -> "KnowledgeBase":
+        if os.path.exists(file_path):
+            with open(file_path, 'r') as file:
+                return cls(json.load(file), **options)
+        else:
+            return cls(**options)
+
+    def to_dict(self) -> dict:
+        return {"questions": list(self), **self.data}
+
+    @property
+    def questions(self) -> List[str]:
+        # The live list, not a copy: read it, don't modify it
+        return self._questions
+
+    def __len__(self) -> int:
+        return len(self._questions)
+
+    def __iter__(self) -> Iterator[dict]:
+        for position, question in enumerate(self._questions):
+            yield {"question": question, "answer": self._answers[position]}
+
+    def __contains__(self, question: str) -> bool:
+        return self._key(question) in self._index
+
+    def _key(self, question: str) -> str:
+        return normalize_question(question, self.fold_case, self.fold_punctuation)
+
+    def _add_question(self, question: str):
+        question = sys.intern(question)
+        position = len(self._questions)
+        self._questions.append(question)
+        # The first entry wins, matching the old linear scan over the list
+        self._index.setdefault(self._key(question), position)
+        self.matcher.add(question)
+
+    def get_answer(self, question: str) -> Optional[str]:
+        position = self._index.get(self._key(question))
+        return self._answers[position] if position is not None else None
+
+    def stored_question(self, question: str) -> Optional[str]:
+        # The question as it was added, for one that matches it under the folding options
+        position = self._index.get(self._key(question))
+        return self._questions[position] if position is not None else None
+
+    def add(self, question: str, answer: str):
+        # Answer first: a reader that finds the question can always read its answer
+        self._answers.append(answer)
+        self._add_question(question)
+
+    def set_answer(self, question: str, answer: str) -> bool:
+        position = self._index.get(self._key(question))
+        if position is None:
+            return False
+        self._answers.replace(position, answer)
+        return True
@@ -0,0 +1,116 @@
+import logging
+import queue
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from knowledge_base import KnowledgeBase, normalize_question
+from storage import KnowledgeBaseStore
+
+MAX_PENDING = 10000  # Lessons queued before learn() starts dropping them
+BATCH_SIZE = 256  # Lessons written with one log append and one fsync
+
+
+class Learner:
+    # Teaches the knowledge base from a background thread. A turn only queues
+    # the question and answer; the writer checks them against what the knowledge
+    # base already knows, logs them through the store (no JSON rewrite) and adds
+    # them to the matcher and lookup index in place. Lessons that arrive while a
+    # write is in progress go out together in the next batch.
+    #
+    # A question already known with the same answer is a duplicate and skipped.
+    # With a different answer it's a conflict: the old answer stays unless the
+    # lesson was queued with replace=True, as corrections from the user are.
+    def __init__(self, store: KnowledgeBaseStore, knowledge_base: KnowledgeBase, max_pending: int = MAX_PENDING,
+                 batch_size: int = BATCH_SIZE):
+        self.store = store
+        self.knowledge_base = knowledge_base
+        self.batch_size = batch_size
+        self.stats: Dict[str, int] = {"learned": 0, "replaced": 0, "duplicates": 0, "conflicts": 0, "dropped": 0,
+                                      "failed": 0, "batches": 0}
+        self._queue: "queue.Queue[Optional[Tuple[str, str, bool]]]" = queue.Queue(max_pending)
+        self._thread: Optional[threading.Thread] = None
+        self._dropping = False
+
+    def start(self) -> "Learner":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="learner", daemon=True)
+            self._thread.start()
+        return self
+
+    def learn(self, question: str, answer: str, replace: bool = False) -> bool:
+        # Never blocks; returns False if the lesson was dropped because the writer is behind
+        question = " ".join(question.split())
+        answer = answer.strip()
+        if not question or not answer:
+            return False
+        try:
+            self._queue.put_nowait((question, answer, replace))
+        except queue.Full:
+            self.stats["dropped"] += 1
+            if not self._dropping:
+                logging.warning("Learning queue full, dropping lessons until the writer catches up")
+            self._dropping = True
+            return False
+        self._dropping = False
+        return True
+
+    def flush(self):
+        # Waits until everything queued so far is in the knowledge base
+        self._queue.join()
+
+    def close(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while True:
+            lessons = [self._queue.get()]
+            while len(lessons) < self.batch_size:
+                try:
+                    lessons.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            batch = [lesson for lesson in lessons if lesson is not None]
+            try:
+                self._write(batch)
+            except Exception:
+                self.stats["failed"] += len(batch)
+                logging.exception("Could not save what was learned")
+            finally:
+                for _ in lessons:
+                    self._queue.task_done()
+            if len(batch) < len(lessons):
+                return  # close()
+
+    def _write(self, lessons: List[Tuple[str, str, bool]]):
+        knowledge_base = self.knowledge_base
+        changes: List[dict] = []
+        staged: Dict[str, dict] = {}  # This batch's change for each question, by the knowledge base's key
+        for question, answer, replace in lessons:
+            key = normalize_question(question, knowledge_base.fold_case, knowledge_base.fold_punctuation)
+            change = staged.get(key)
+            known = change["answer"] if change is not None else knowledge_base.get_answer(question)
+            if known == answer:
+                self.stats["duplicates"] += 1
+                continue
+            if known is not None and not replace:
+                self.stats["conflicts"] += 1
+                logging.info(f"Kept the known answer to {question!r} over {answer!r}")
+                continue
+            if known is None:
+                self.stats["learned"] += 1
+                change = {"op": "add", "question": question, "answer": answer}
+            elif change is not None:
+                self.stats["replaced"] += 1
+                change["answer"] = answer  # Corrected before it was written
+                continue
+            else:
+                self.stats["replaced"] += 1
+                change = {"op": "replace", "question": knowledge_base.stored_question(question), "answer": answer}
+            staged[key] = change
+            changes.append(change)
+        if changes:
+            self.store.write(knowledge_base, changes)
+            self.stats["batches"] += 1
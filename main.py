@@ -0,0 +1,72 @@
+import argparse
+import runpy
+import sys
+import threading
+import time
+
+STARTED = time.perf_counter()
+
+
+def attach_semantic_index(engine, directory: str, threshold: float):
+    # numpy takes longer to import than everything else together, so the index
+    # is loaded behind the first prompt; turns before it lands use the fuzzy matcher.
+    from semantic import load_semantic_index
+
+    engine.semantic_index = load_semantic_index(directory, engine.knowledge_base.questions, threshold)
+
+
+def text_chat(report_startup: bool = False):
+    import app
+    from core import ChatEngine, Session
+    from intents import IntentRouter, load_intents
+    from learning import Learner
+    from storage import KnowledgeBaseStore
+
+    # Loaded from knowledge_base.json.snapshot when the JSON file hasn't changed
+    knowledge_store = KnowledgeBaseStore(app.KNOWLEDGE_BASE_PATH)
+    knowledge_base = knowledge_store.load()
+    learner = Learner(knowledge_store, knowledge_base).start() if app.LEARN_REMOTE_ANSWERS else None
+    engine = ChatEngine(knowledge_base, app.client, app.get_response_cache(), app.QUERY_LIMIT, app.QUERY_COUNT_PATH,
+                        IntentRouter(load_intents(app.INTENTS_PATH)), learner=learner)
+    threading.Thread(target=attach_semantic_index, args=(engine, app.SEMANTIC_INDEX_PATH, app.SEMANTIC_THRESHOLD),
+                     daemon=True).start()
+    session = Session()
+    if report_startup:
+        print(f"Ready in {(time.perf_counter() - STARTED) * 1000:.0f} ms after main.py started", file=sys.stderr)
+
+    try:
+        while True:
+            try:
+                user_input = input('You: ')
+            except EOFError:
+                break
+            response = engine.respond(user_input, session)
+            if response.url:
+                import webbrowser
+                webbrowser.open_new_tab(response.url)
+            print(f'ELEY: {response.text}')
+            if response.end_session:
+                break
+    finally:
+        if learner is not None:
+            learner.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chat with ELEY")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--voice", action="store_true", help="speak and listen (app.py)")
+    mode.add_argument("--device", action="store_true", help="voice plus Arduino control (eley.py)")
+    parser.add_argument("--report-startup", action="store_true", help="print the time to the first prompt")
+    args = parser.parse_args()
+
+    if args.voice:
+        runpy.run_module("app", run_name="__main__")
+    elif args.device:
+        runpy.run_module("eley", run_name="__main__")
+    else:
+        text_chat(args.report_startup)
+
+
+if __name__ == '__main__':
+    main()
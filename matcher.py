@@ -0,0 +1,146 @@
+import heapq
+from array import array
+from collections import Counter
+from difflib import SequenceMatcher
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Keys of the inverted index are (character, occurrence) pairs: "hello" is indexed
+# under ('h', 1), ('e', 1), ('l', 1), ('l', 2) and ('o', 1). The number of keys two
+# strings share is exactly the character-multiset overlap difflib's quick_ratio()
+# uses, which is an upper bound on ratio(), so pruning on it never drops a match.
+Key = Tuple[str, int]
+
+
+def _char_keys(text: str) -> List[Key]:
+    seen: Dict[str, int] = {}
+    keys = []
+    for char in text:
+        seen[char] = seen.get(char, 0) + 1
+        keys.append((char, seen[char]))
+    return keys
+
+
+def _position_masks(text: str) -> Dict[str, int]:
+    masks: Dict[str, int] = {}
+    for position, char in enumerate(text):
+        masks[char] = masks.get(char, 0) | (1 << position)
+    return masks
+
+
+def _lcs_length(text: str, masks: Dict[str, int], other: str) -> int:
+    # Bit-parallel longest common subsequence (Hyyrö). SequenceMatcher's matching
+    # blocks form a common subsequence, so this is a tighter bound than the
+    # character overlap while still never rejecting a real match.
+    full = (1 << len(text)) - 1
+    row = full
+    for char in other:
+        matched = row & masks.get(char, 0)
+        row = ((row + matched) | (row - matched)) & full
+    return len(text) - row.bit_count()
+
+
+_np = None
+
+
+def _numpy():
+    # numpy speeds up overlap counting when it's installed. It's imported on the
+    # first query rather than with this module, which text mode loads at startup.
+    global _np
+    if _np is None:
+        try:
+            import numpy
+            _np = numpy
+        except ImportError:
+            _np = False
+    return _np or None
+
+
+class FuzzyMatcher:
+    def __init__(self, questions: Iterable[str] = (), cutoff: float = 0.6):
+        if not 0.0 <= cutoff <= 1.0:
+            raise ValueError(f"cutoff must be in [0.0, 1.0]: {cutoff!r}")
+        self.cutoff = cutoff
+        self._questions: List[str] = []
+        # Each posting list is an array of ascending question indexes, far smaller than a set
+        self._postings: Dict[Key, array] = {}
+        for question in questions:
+            self.add(question)
+
+    def __len__(self) -> int:
+        return len(self._questions)
+
+    def add(self, question: str):
+        index = len(self._questions)
+        self._questions.append(question)
+        for key in _char_keys(question):
+            self._postings.setdefault(key, array('I')).append(index)
+
+    def _overlaps(self, word: str) -> Dict[int, int]:
+        postings = [self._postings[key] for key in _char_keys(word) if key in self._postings]
+        numpy = _numpy()
+        if numpy is not None and postings:
+            # One bincount over all posting lists instead of boxing every index. Copied
+            # with tobytes(): a view would pin the arrays, and add() from another
+            # thread (learning.py) can't grow an array while it is exported.
+            arrays = [numpy.frombuffer(indexes.tobytes(), dtype=f"u{indexes.itemsize}") for indexes in postings]
+            counts = numpy.bincount(numpy.concatenate(arrays))
+            found = numpy.flatnonzero(counts)
+            overlaps: Dict[int, int] = dict(zip(found.tolist(), counts[found].tolist()))
+        else:
+            overlaps = Counter()
+            for indexes in postings:
+                overlaps.update(indexes)
+        if self.cutoff == 0.0 or not word:
+            # Questions sharing no character with the query can still reach the
+            # cutoff here (everything scores >= 0.0, and "" matches "" exactly).
+            for index in range(len(self._questions)):
+                if index not in overlaps:
+                    overlaps[index] = 0
+        return overlaps
+
+    def close_matches(self, word: str, n: int = 1) -> List[str]:
+        return [question for score, question in self.scored_matches(word, n)]
+
+    def scored_matches(self, word: str, n: int = 1) -> List[Tuple[float, str]]:
+        # (score, question), best first; the top n of several matchers' results
+        # is what one matcher over all of their questions would return
+        if not n > 0:
+            raise ValueError(f"n must be > 0: {n!r}")
+        cutoff = self.cutoff
+        length = len(word)
+        questions = self._questions
+
+        bounded = []
+        for index, overlap in self._overlaps(word).items():
+            question = questions[index]
+            total = length + len(question)
+            bound = 2.0 * overlap / total if total else 1.0
+            if bound >= cutoff:
+                bounded.append((bound, question))
+        bounded.sort(reverse=True)
+
+        # Same scoring as difflib.get_close_matches, visited best bound first so we
+        # can stop once no remaining candidate can beat the current n-th score.
+        matcher = SequenceMatcher()
+        matcher.set_seq2(word)
+        masks = _position_masks(word)
+        result: List[Tuple[float, str]] = []
+        for bound, question in bounded:
+            floor = result[0][0] if len(result) >= n else cutoff
+            if bound < floor:
+                break
+            total = length + len(question)
+            if total and 2.0 * _lcs_length(word, masks, question) / total < floor:
+                continue
+            matcher.set_seq1(question)
+            score = matcher.ratio()
+            if score >= cutoff:
+                if len(result) < n:
+                    heapq.heappush(result, (score, question))
+                else:
+                    heapq.heappushpop(result, (score, question))
+        return heapq.nlargest(n, result)
+
+    def best_match(self, word: str) -> Optional[str]:
+        matches = self.close_matches(word, n=1)
+        return matches[0] if matches else None
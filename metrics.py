@@ -0,0 +1,232 @@
+import bisect
+import functools
+import json
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from storage import write_text_atomic
+
+# Upper bounds in seconds, from a dictionary lookup up to a long spoken reply
+BUCKETS = (0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+NO_INTENT = "none"
+CO_COROUTINE = 0x80  # inspect.CO_COROUTINE; importing asyncio for iscoroutinefunction adds ~50 ms to startup
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        # Upper bound of the bucket holding the q-th observation, like histogram_quantile()
+        rank = q * self.count
+        seen = 0
+        for position, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return self.buckets[position] if position < len(self.buckets) else float("inf")
+        return 0.0
+
+    def to_dict(self) -> dict:
+        return {"count": self.count, "sum": self.sum, "buckets": dict(zip(map(str, self.buckets), self.counts)),
+                "inf": self.counts[-1], "p50": self.quantile(0.5), "p95": self.quantile(0.95)}
+
+
+class Trace:
+    def __init__(self):
+        self.intent = NO_INTENT
+        self.spans: List[Tuple[str, float]] = []
+        self.closed = False
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+
+
+class Tracer:
+    # Spans time one stage of a turn. Inside tracer.turn() they are held until the
+    # turn ends so every stage can be labelled with the intent the turn resolved
+    # to; outside a turn they are recorded straight away under intent "none".
+    # asyncio tasks and to_thread() copy the current context, so spans started
+    # there still belong to the turn that started them.
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS, enabled: bool = True):
+        self.buckets = buckets
+        self.enabled = enabled
+        self.stages: Dict[Tuple[str, str], Histogram] = {}
+        self.turns: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def _histogram(self, histograms: dict, key) -> Histogram:
+        # Callers hold self._lock
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = Histogram(self.buckets)
+        return histogram
+
+    def observe(self, stage: str, seconds: float, intent: str = NO_INTENT):
+        with self._lock:
+            self._histogram(self.stages, (stage, intent)).observe(seconds)
+
+    def observe_turn(self, seconds: float, intent: str):
+        with self._lock:
+            self._histogram(self.turns, intent).observe(seconds)
+
+    def record(self, stage: str, seconds: float):
+        trace = _current_trace.get()
+        if trace is None or trace.closed:
+            # Speech that is still playing after its turn ended lands here
+            self.observe(stage, seconds, trace.intent if trace else NO_INTENT)
+        else:
+            trace.spans.append((stage, seconds))
+
+    @contextmanager
+    def span(self, stage: str) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - started)
+
+    def traced(self, stage: str) -> Callable:
+        # Same as wrapping the body in span(), without a generator per call
+        def decorator(func: Callable) -> Callable:
+            if getattr(func, "__code__", None) is not None and func.__code__.co_flags & CO_COROUTINE:
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    if not self.enabled:
+                        return await func(*args, **kwargs)
+                    started = time.perf_counter()
+                    try:
+                        return await func(*args, **kwargs)
+                    finally:
+                        self.record(stage, time.perf_counter() - started)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                started = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.record(stage, time.perf_counter() - started)
+            return wrapper
+        return decorator
+
+    @contextmanager
+    def turn(self) -> Iterator[Trace]:
+        trace = Trace()
+        token = _current_trace.set(trace)
+        started = time.perf_counter()
+        try:
+            yield trace
+        finally:
+            elapsed = time.perf_counter() - started
+            _current_trace.reset(token)
+            trace.closed = True
+            if self.enabled:
+                with self._lock:
+                    self._histogram(self.turns, trace.intent).observe(elapsed)
+                    for stage, seconds in trace.spans:
+                        self._histogram(self.stages, (stage, trace.intent)).observe(seconds)
+
+    @contextmanager
+    def background(self, intent: str) -> Iterator[None]:
+        # Work off any turn's path (prefetching) is recorded as it happens, under its own intent
+        trace = Trace()
+        trace.intent = intent
+        trace.closed = True
+        token = _current_trace.set(trace)
+        try:
+            yield
+        finally:
+            _current_trace.reset(token)
+
+    def set_intent(self, intent: str):
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.intent = intent
+
+    def to_json(self) -> dict:
+        with self._lock:
+            return {"turns": {intent: histogram.to_dict() for intent, histogram in sorted(self.turns.items())},
+                    "stages": [dict(stage=stage, intent=intent, **histogram.to_dict())
+                               for (stage, intent), histogram in sorted(self.stages.items())]}
+
+    def write_json(self, file_path: str, **extra):
+        # extra: other sections for the same file, e.g. prefetch=Prefetcher.report()
+        write_text_atomic(file_path, json.dumps({**self.to_json(), **extra}, indent=2), fsync=False)
+
+    def prometheus(self, prefix: str = "eley") -> str:
+        lines = [f"# HELP {prefix}_turn_seconds Time from the start of a turn to its reply, by intent",
+                 f"# TYPE {prefix}_turn_seconds histogram"]
+        with self._lock:
+            for intent, histogram in sorted(self.turns.items()):
+                lines.extend(_prometheus_histogram(f"{prefix}_turn_seconds", f'intent="{intent}"', histogram))
+            lines += [f"# HELP {prefix}_stage_seconds Time spent in each stage of a turn, by intent",
+                      f"# TYPE {prefix}_stage_seconds histogram"]
+            for (stage, intent), histogram in sorted(self.stages.items()):
+                lines.extend(_prometheus_histogram(f"{prefix}_stage_seconds", f'stage="{stage}",intent="{intent}"',
+                                                   histogram))
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self.stages.clear()
+            self.turns.clear()
+
+
+def _prometheus_histogram(name: str, labels: str, histogram: Histogram) -> List[str]:
+    lines = []
+    cumulative = 0
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+    lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+    lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+    return lines
+
+
+def start_metrics_server(tracer: "Tracer", port: int, host: str = '127.0.0.1'):
+    # For the voice loops, which have no server of their own: GET /metrics for
+    # Prometheus, GET /metrics.json for the same numbers as JSON.
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/metrics":
+                body, content_type = tracer.prometheus().encode(), "text/plain; version=0.0.4"
+            elif self.path == "/metrics.json":
+                body, content_type = json.dumps(tracer.to_json()).encode(), "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+TRACER = Tracer()
@@ -0,0 +1,170 @@
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from core import LOOKUP_INTENTS, ChatEngine, Session
+from knowledge_base import normalize_question
+from metrics import TRACER
+from response_cache import cache_key
+
+# Follow-ups people ask about whatever the last answer was about; the ones that
+# turn out to be asked are tried first, see Prefetcher.candidates
+FOLLOW_UP_TEMPLATES = (
+    "how big is {topic}",
+    "where is {topic}",
+    "how old is {topic}",
+    "what is the population of {topic}",
+    "what is the capital of {topic}",
+    "how far away is {topic}",
+    "what is {topic}",
+    "who is {topic}",
+)
+NEIGHBOURS = 3  # Knowledge-base questions closest to the last one, matched ahead of time
+MATCH_BUDGET = 6  # Uncached matches per turn; each costs about as much as the turn's own match
+REMOTE_BUDGET = 0  # Speculative Wolfram Alpha queries per turn; off unless the query limit can spare them
+QUERY_RESERVE = 4  # Queries under the limit that are only spent on questions actually asked
+REMOTE_MIN_HIT_RATE = 0.15  # Templates that stay below this stop spending queries
+HORIZON = 3  # Turns a prefetched question can still count as a hit
+NEIGHBOUR = "neighbour"
+PREFETCH_INTENT = "prefetch"
+
+
+class Prefetcher:
+    # While a reply plays, looks up what the user is likely to ask next: the
+    # knowledge-base questions closest to the one just answered, and common
+    # follow-ups about its topic ("how big is france" after "what is the capital
+    # of france", or "how big is it" once the session resolves it). Matches land
+    # in the engine's match cache and remote answers in its response cache, so
+    # the next turn finds them there. Hit rates are kept per source to tune by.
+    def __init__(self, engine: ChatEngine, neighbours: int = NEIGHBOURS,
+                 templates: Iterable[str] = FOLLOW_UP_TEMPLATES, match_budget: int = MATCH_BUDGET,
+                 remote_budget: int = REMOTE_BUDGET, query_reserve: int = QUERY_RESERVE,
+                 remote_min_hit_rate: float = REMOTE_MIN_HIT_RATE, horizon: int = HORIZON):
+        self.engine = engine
+        self.neighbours = neighbours
+        self.match_budget = match_budget
+        self.templates = list(templates)
+        self.remote_budget = remote_budget
+        self.query_reserve = query_reserve
+        self.remote_min_hit_rate = remote_min_hit_rate
+        self.horizon = horizon
+        self.stats: Dict[str, int] = {"turns": 0, "issued": 0, "remote": 0, "hits": 0, "wasted": 0,
+                                      "over_budget": 0}
+        self.sources: Dict[str, Dict[str, int]] = {}  # Source (template or NEIGHBOUR) -> issued, hits
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+        self._pending: Dict[str, Tuple[str, int]] = {}  # Cache key -> source, turn it was issued in
+        self._turn = 0
+        self._round = 0  # Bumped to stop the round in progress; see before_turn
+        self._lock = threading.Lock()
+
+    def before_turn(self):
+        # Call as soon as the next utterance arrives: speculation stops at its next
+        # candidate instead of competing with the turn's own lookups
+        with self._lock:
+            self._round += 1
+
+    def after_turn(self, session: Session) -> Optional[Future]:
+        # Call once the reply is known and before it plays; scores the turn against
+        # earlier speculation and starts the next round in the background
+        _, response = session.history[-1] if session.history else (None, None)
+        lookup = response is not None and response.intent in LOOKUP_INTENTS
+        with self._lock:
+            self._turn += 1
+            self.stats["turns"] += 1
+            if lookup:
+                self._score(cache_key(session.last_question))
+            self._expire()
+            self._round += 1
+            turn, round_ = self._turn, self._round
+        if not lookup:
+            return None
+        return self.executor.submit(self._run, session.last_question, session.topic, turn, round_)
+
+    def close(self):
+        with self._lock:
+            self._round += 1  # Stops a round in progress at its next candidate
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _score(self, key: str):
+        # Callers hold self._lock
+        pending = self._pending.pop(key, None)
+        if pending is not None:
+            self.stats["hits"] += 1
+            self.sources[pending[0]]["hits"] += 1
+
+    def _expire(self):
+        # Callers hold self._lock
+        expired = [key for key, (_, turn) in self._pending.items() if turn + self.horizon <= self._turn]
+        for key in expired:
+            del self._pending[key]
+        self.stats["wasted"] += len(expired)
+
+    def candidates(self, question: str, topic: Optional[str]) -> List[Tuple[str, str]]:
+        # (source, question) pairs, knowledge-base neighbours first since they cost no queries
+        found = [(NEIGHBOUR, normalize_question(neighbour, fold_case=True, fold_punctuation=True))
+                 for neighbour in self.engine.matcher.close_matches(question, self.neighbours + 1)]
+        if topic:
+            with self._lock:
+                rates = {template: self._hit_rate(template) for template in self.templates}
+            ranked = sorted(self.templates, key=lambda template: -rates[template])
+            found += [(template, template.format(topic=topic)) for template in ranked]
+        return found
+
+    def _hit_rate(self, source: str) -> float:
+        # Smoothed, so templates that were never tried still get their turn
+        counts = self.sources.get(source, {"issued": 0, "hits": 0})
+        return (counts["hits"] + 1) / (counts["issued"] + 2)
+
+    def _can_query(self, source: str) -> bool:
+        engine = self.engine
+        with self._lock:
+            rate = self._hit_rate(source)
+        return (engine.client is not None and engine.query_count + self.query_reserve < engine.query_limit
+                and rate >= self.remote_min_hit_rate)
+
+    def _run(self, question: str, topic: Optional[str], turn: int, round_: int):
+        try:
+            with TRACER.background(PREFETCH_INTENT):
+                self._prefetch(question, topic, turn, round_)
+        except Exception:
+            logging.exception(f"Prefetching after {question!r} failed")
+
+    def _prefetch(self, question: str, topic: Optional[str], turn: int, round_: int):
+        asked = cache_key(question)
+        matches = remote = 0
+        for source, candidate in self.candidates(question, topic):
+            if self._round != round_:
+                return  # The next turn has started
+            key = cache_key(candidate)
+            if key == asked or key in self._pending:
+                continue
+            cached, best_match = self.engine.cached_match(candidate)
+            if not cached:
+                if matches >= self.match_budget:
+                    with self._lock:
+                        self.stats["over_budget"] += 1
+                    continue
+                best_match = self.engine.find_best_match(candidate)
+                matches += 1
+            if best_match is None and source != NEIGHBOUR and candidate not in self.engine.response_cache:
+                if remote >= self.remote_budget or not self._can_query(source):
+                    with self._lock:
+                        self.stats["over_budget"] += 1
+                    continue
+                self.engine.query_remote(candidate)
+                remote += 1
+                with self._lock:
+                    self.stats["remote"] += 1
+            with self._lock:
+                self._pending[key] = (source, turn)
+                self.stats["issued"] += 1
+                counts = self.sources.setdefault(source, {"issued": 0, "hits": 0})
+                counts["issued"] += 1
+
+    def report(self) -> dict:
+        with self._lock:
+            return {**self.stats,
+                    "hit_rate": self.stats["hits"] / self.stats["issued"] if self.stats["issued"] else 0.0,
+                    "sources": {source: {**counts, "hit_rate": counts["hits"] / counts["issued"]}
+                                for source, counts in sorted(self.sources.items())}}
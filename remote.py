@@ -0,0 +1,272 @@
+import json
+import logging
+import queue
+import random
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, NamedTuple, Optional
+from urllib.parse import urlencode, urlsplit
+
+from response_cache import cache_key
+
+if TYPE_CHECKING:
+    import http.client
+
+API_URL = "https://api.wolframalpha.com/v2/query"
+APP_ID_ENV = "WOLFRAM_APP_ID"  # Environment variable the command-line tools read the App ID from
+REQUEST_TIMEOUT = 10
+MAX_CONNECTIONS = 4
+RATE = 2.0  # Requests per second, refilled continuously
+BURST = 5
+MAX_RATE_WAIT = 5  # Longest a caller waits for a token before giving up
+RETRIES = 2
+BACKOFF = 0.5  # Seconds before the first retry, doubled for each one after
+FAILURE_THRESHOLD = 5  # Consecutive failed queries that open the circuit
+RESET_TIMEOUT = 30  # Seconds the circuit stays open before one query may try again
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class RemoteError(Exception):
+    pass
+
+
+class RateLimitedError(RemoteError):
+    pass
+
+
+class CircuitOpenError(RemoteError):
+    pass
+
+
+class _RetryableError(RemoteError):
+    pass
+
+
+class Pod(NamedTuple):
+    title: str
+    text: Optional[str]
+
+
+class RemoteResult(NamedTuple):
+    # Shaped like wolframalpha.Result, so query_with_cache reads next(res.results).text
+    pods: List[Pod]
+
+    @property
+    def results(self) -> Iterator[Pod]:
+        return iter(self.pods)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.sleep = sleep
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, max_wait: float = MAX_RATE_WAIT):
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            wait = (1 - self._tokens) / self.rate if self._tokens < 1 else 0.0
+            if wait > max_wait:
+                raise RateLimitedError(f"Rate limit reached, next slot in {wait:.1f}s")
+            # Taking the token now (possibly going negative) reserves our place in line
+            self._tokens -= 1
+        if wait:
+            self.sleep(wait)
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = FAILURE_THRESHOLD, reset_timeout: float = RESET_TIMEOUT,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if self.clock() - self.opened_at >= self.reset_timeout else "open"
+
+    def before(self):
+        with self._lock:
+            state = self.state
+            if state == "open" or state == "half_open" and self._probing:
+                raise CircuitOpenError("Wolfram Alpha is failing, not trying again yet")
+            self._probing = state == "half_open"
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def abandon(self):
+        # A probe that never reached the service; let the next query try instead
+        with self._lock:
+            self._probing = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+            self._probing = False
+
+
+class WolframAlphaProvider:
+    # Drop-in for wolframalpha.Client(app_id).query(). Requests reuse a small
+    # pool of keep-alive connections, wait for a rate limit token, retry
+    # transient failures with backoff and stop for a while once the service
+    # keeps failing. Concurrent queries for the same question share one request.
+    def __init__(self, app_id: str, url: str = API_URL, timeout: float = REQUEST_TIMEOUT,
+                 max_connections: int = MAX_CONNECTIONS, rate: float = RATE, burst: int = BURST,
+                 max_rate_wait: float = MAX_RATE_WAIT, retries: int = RETRIES, backoff: float = BACKOFF,
+                 breaker: Optional[CircuitBreaker] = None, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            raise ValueError(f"Unsupported URL: {url!r}")
+        self.app_id = app_id
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_rate_wait = max_rate_wait
+        self.sleep = sleep
+        self.bucket = TokenBucket(rate, burst, clock, sleep)
+        self.breaker = breaker or CircuitBreaker(clock=clock)
+        self.stats: Dict[str, int] = {"queries": 0, "requests": 0, "retries": 0, "coalesced": 0,
+                                      "failures": 0, "rejected": 0, "connections": 0}
+        self._scheme = parts.scheme
+        self._host = parts.netloc
+        self._path = parts.path or "/"
+        self._idle: "queue.LifoQueue[http.client.HTTPConnection]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._in_flight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def query(self, question: str) -> RemoteResult:
+        key = cache_key(question)
+        with self._lock:
+            self.stats["queries"] += 1
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = Future()
+            else:
+                self.stats["coalesced"] += 1
+        if not leader:
+            return future.result()
+        try:
+            result = self._query(question)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    def _query(self, question: str) -> RemoteResult:
+        try:
+            self.breaker.before()
+        except CircuitOpenError:
+            self.stats["rejected"] += 1
+            raise
+        for attempt in range(self.retries + 1):
+            try:
+                self.bucket.acquire(self.max_rate_wait)
+            except RateLimitedError:
+                self.breaker.abandon()
+                raise
+            try:
+                result = self._request(question)
+            except _RetryableError as e:
+                if attempt == self.retries:
+                    self.stats["failures"] += 1
+                    self.breaker.failure()
+                    raise RemoteError(f"Wolfram Alpha query failed after {attempt + 1} attempts: {e}") from e
+                self.stats["retries"] += 1
+                delay = self.backoff * 2 ** attempt * random.uniform(0.5, 1.0)
+                logging.warning(f"Wolfram Alpha request failed ({e}), retrying in {delay:.2f}s")
+                self.sleep(delay)
+            except RemoteError:
+                # The service answered, just not with a result; it isn't down
+                self.breaker.success()
+                raise
+            else:
+                self.breaker.success()
+                return result
+
+    @contextmanager
+    def _connection(self) -> Iterator["http.client.HTTPConnection"]:
+        import http.client  # ~40 ms to import, so it waits for the first query
+
+        self._slots.acquire()
+        try:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                connection_class = http.client.HTTPSConnection if self._scheme == "https" else http.client.HTTPConnection
+                connection = connection_class(self._host, timeout=self.timeout)
+                self.stats["connections"] += 1
+            try:
+                yield connection
+            except BaseException:
+                connection.close()
+                raise
+            self._idle.put(connection)
+        finally:
+            self._slots.release()
+
+    def _request(self, question: str) -> RemoteResult:
+        import http.client
+
+        params = urlencode({"appid": self.app_id, "input": question, "format": "plaintext", "output": "json"})
+        self.stats["requests"] += 1
+        try:
+            with self._connection() as connection:
+                connection.request("GET", f"{self._path}?{params}", headers={"Accept": "application/json"})
+                response = connection.getresponse()
+                body = response.read()
+        except (OSError, http.client.HTTPException) as e:
+            raise _RetryableError(f"{type(e).__name__}: {e}") from e
+        if response.status in RETRY_STATUSES:
+            raise _RetryableError(f"HTTP {response.status}")
+        if response.status != 200:
+            raise RemoteError(f"Wolfram Alpha returned HTTP {response.status}")
+        try:
+            result = json.loads(body)["queryresult"]
+        except (ValueError, KeyError) as e:
+            raise _RetryableError(f"Malformed response: {e}") from e
+        if result.get("error"):
+            error = result["error"]
+            raise RemoteError(f"Wolfram Alpha error: {error.get('msg') if isinstance(error, dict) else error}")
+        # Same pods wolframalpha.Result.results picks: the primary one or one titled "Result"
+        pods = []
+        for pod in result.get("pods", []):
+            if pod.get("primary") or pod.get("title") == "Result":
+                subpods = pod.get("subpods", [])
+                pods.append(Pod(pod.get("title", ""), subpods[0].get("plaintext") if subpods else None))
+        return RemoteResult(pods)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
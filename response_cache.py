@@ -0,0 +1,150 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from knowledge_base import normalize_question
+from storage import COMPACT_EVERY, SEQ_KEY, WriteAheadLog, write_text_atomic
+
+DEFAULT_TTL = 7 * 24 * 60 * 60  # Remote answers rarely change within a week
+NEGATIVE_TTL = 60 * 60  # Retry "no result" questions sooner
+
+
+def cache_key(question: str) -> str:
+    return normalize_question(question, fold_case=True, fold_punctuation=True)
+
+
+class ResponseCache:
+    # Answers are appended to <file>.log as they arrive and folded into the JSON
+    # file every compact_every of them, so a put costs one short append rather
+    # than rewriting the whole cache. Without fsync: a lost answer costs a query.
+    def __init__(self, file_path: Optional[str] = None, max_entries: int = 10000, ttl: float = DEFAULT_TTL,
+                 negative_ttl: float = NEGATIVE_TTL, clock: Callable[[], float] = time.time, autosave: bool = True,
+                 compact_every: int = COMPACT_EVERY, fsync: bool = False):
+        self.file_path = file_path
+        self.log = WriteAheadLog(file_path, fsync) if file_path else None
+        # Bulk writers turn autosave off and call save() themselves
+        self.autosave = autosave
+        self.compact_every = compact_every
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.clock = clock
+        self.stats: Dict[str, int] = {"hits": 0, "negative_hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._seq = 0  # Last log record in the JSON file or applied since
+        self._pending = 0
+        self.load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, question: str) -> bool:
+        entry = self._entries.get(cache_key(question))
+        return entry is not None and entry["expires_at"] > self.clock()
+
+    def load(self):
+        if self.log is None:
+            return
+        with self._lock, self.log.locked():
+            data = self.log.read_base() or {}
+            self._entries = OrderedDict(data.get("entries", {}))
+            self.stats.update(data.get("stats", {}))
+            self._seq = data.get(SEQ_KEY, 0)
+            records = self.log.read_records(after=self._seq)
+            self.log.start_log(self._seq)
+        for record in records:
+            self._apply(record)
+        self._pending = len(records)
+
+    def _apply(self, record: dict):
+        if record["op"] == "put":
+            self._store(record["key"], {"answer": record["answer"], "expires_at": record["expires_at"]})
+        self._seq = max(self._seq, record["seq"])
+
+    def _store(self, key: str, entry: dict):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def save(self):
+        if self.log is None:
+            return
+        with self._lock, self.log.locked():
+            # Answers other processes logged since are kept as well
+            records = self.log.read_records(after=self._seq)
+            for record in records:
+                self._apply(record)
+            self._write_base()
+
+    def _write_base(self):
+        # Call with both locks held. The checkpoint keeps the sequence going, as in storage
+        data = {"entries": self._entries, "stats": self.stats, SEQ_KEY: self._seq}
+        write_text_atomic(self.file_path, json.dumps(data), self.log.fsync)
+        write_text_atomic(self.log.log_path, json.dumps({"op": "checkpoint", "seq": self._seq}) + "\n",
+                          self.log.fsync)
+        self._pending = 0
+
+    def lookup(self, question: str) -> Tuple[bool, Optional[str]]:
+        key = cache_key(question)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry["expires_at"] <= self.clock():
+                del self._entries[key]
+                self.stats["expired"] += 1
+                entry = None
+            if entry is None:
+                self.stats["misses"] += 1
+                return False, None
+            self._entries.move_to_end(key)
+            if entry["answer"] is None:
+                self.stats["negative_hits"] += 1
+            else:
+                self.stats["hits"] += 1
+            return True, entry["answer"]
+
+    def put(self, question: str, answer: Optional[str], ttl: Optional[float] = None):
+        if ttl is None:
+            ttl = self.ttl if answer is not None else self.negative_ttl
+        key = cache_key(question)
+        with self._lock:
+            entry = {"answer": answer, "expires_at": self.clock() + ttl}
+            self._store(key, entry)
+            if self.autosave and self.log is not None:
+                record = self.log.extend([{"op": "put", "key": key, **entry}])[-1]
+                if record["seq"] != self._seq + 1:
+                    # Other processes logged answers since; take those in, but not this one again
+                    for other in self.log.read_records(after=self._seq):
+                        if other["seq"] != record["seq"]:
+                            self._apply(other)
+                self._seq = record["seq"]
+                self._pending += 1
+                if self._pending >= self.compact_every:
+                    self.save()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self.log is not None:
+                with self.log.locked():
+                    records = self.log.read_records(after=self._seq)
+                    if records:
+                        self._seq = records[-1]["seq"]
+                    self._write_base()
+
+
+def query_with_cache(client, question: str, cache: ResponseCache) -> Optional[str]:
+    found, answer = cache.lookup(question)
+    if found:
+        return answer
+    res = client.query(question)
+    try:
+        answer = next(res.results).text
+    except StopIteration:
+        answer = None
+    cache.put(question, answer)
+    return answer
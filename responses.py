@@ -0,0 +1,47 @@
+# Responses for small talk
+THANK_YOU_RESPONSES = ["You're welcome!", "Glad I could help!", "Anytime!"]
+GOODBYE_RESPONSES = ["Goodbye!", "See you later!", "Take care!"]
+CONFUSED_RESPONSES = ["Sorry, I'm not sure what you mean.", "Could you rephrase that?", "I'm having trouble understanding."]
+APOLOGY_RESPONSES = ["I apologize if I offended you.", "I'm sorry if my response was inappropriate.", "I didn't mean to upset you."]
+
+# Jokes collection
+JOKES = [
+    "Why was the equal sign so humble? Because he knew he wasn't less than or greater than anyone else!",
+    "Parallel lines have so much in common. It’s a shame they’ll never meet.",
+    "Why do plants hate math? Because it gives them square roots!",
+    "I would tell you a chemistry joke, but I know I wouldn't get a reaction.",
+    "Why do biologists get invited to all the parties? Because they have good genes!",
+    "What do you get when you mix sulfur, tungsten, and silver? SWAG!",
+    "Why was the math book sad? It had too many problems.",
+    "What did the biologist wear to impress their date? Designer genes!",
+    "Why was the mole of oxygen molecules excited when he walked out of the singles bar? He got Avogadro's number!",
+    "What do you call a tooth in a glass of water? A one molar solution!",
+    "Why do programmers prefer dark mode? Because the light attracts bugs!",
+    "Why did the physics teacher break up with the biology teacher? There was no chemistry.",
+    "How many software engineers does it take to change a light bulb? None, that's a hardware issue.",
+    "Why can't you trust an atom? Because they make up everything!",
+    "What did one ion say to the other? I've got my ion you.",
+    "Why did the computer keep sneezing? It had a virus!",
+    "What did the biologist wear to impress their date? Designer genes!",
+    "Why did the scarecrow win an award? Because he was outstanding in his field!",
+    "How does a scientist freshen their breath? With experi-mints!",
+    "Why did the biology teacher go to jail? They were caught multiplying in public!"
+]
+
+EMOTION_RESPONSES = {
+    "sad": "I'm sorry to hear that. Is there something specific you'd like to talk about?",
+    "bored": "Here are a few things you could try: read a book, watch a movie, or try a new hobby."
+}
+DEFAULT_EMOTION_RESPONSE = "I'm here to chat! What's on your mind?"
+
+# Fixed replies used by the chat loops
+SEARCH_FOUND_RESPONSE = "I found this information online."
+SEARCH_FAILED_RESPONSE = "Sorry, I couldn't perform the Google search."
+QUERY_LIMIT_RESPONSE = "Query limit reached. Please try again later."
+NO_ANSWER_RESPONSE = "Sorry, I couldn't find an answer for that."
+
+# Every reply that never changes, for pre-rendering speech
+STATIC_RESPONSES = (THANK_YOU_RESPONSES + GOODBYE_RESPONSES + CONFUSED_RESPONSES + APOLOGY_RESPONSES + JOKES
+                    + list(EMOTION_RESPONSES.values())
+                    + [DEFAULT_EMOTION_RESPONSE, SEARCH_FOUND_RESPONSE, SEARCH_FAILED_RESPONSE,
+                       QUERY_LIMIT_RESPONSE, NO_ANSWER_RESPONSE])
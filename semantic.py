@@ -0,0 +1,197 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import zlib
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # Semantic matching is optional; the fuzzy matcher works without it
+    np = None
+
+DIMENSIONS = 1024  # Hashed feature slots; 100k questions take 400 MB as float32
+THRESHOLD = 0.6  # Cosine similarity a question needs to count as a match
+TRIGRAM_WEIGHT = 0.5  # Character trigrams catch typos but say less than a whole word
+INDEX_VERSION = 1
+
+CONTRACTIONS = {"'s": " is", "'re": " are", "'m": " am", "n't": " not", "'ll": " will", "'ve": " have", "'d": " would"}
+SYNONYMS = {
+    "father": "dad", "daddy": "dad", "papa": "dad",
+    "mom": "mother", "mum": "mother", "mommy": "mother", "mummy": "mother",
+    "grandmother": "grandma", "granny": "grandma", "nana": "grandma",
+    "grandfather": "grandpa", "grandad": "grandpa", "granddad": "grandpa",
+    "whats": "what is", "hows": "how is", "whos": "who is", "im": "i am",
+    "hi": "hello", "hey": "hello", "yo": "hello",
+}
+
+_CONTRACTION = re.compile(r"'s\b|'re\b|'m\b|n't\b|'ll\b|'ve\b|'d\b")
+_WORD = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    text = _CONTRACTION.sub(lambda found: CONTRACTIONS[found.group()], text.casefold().replace("’", "'"))
+    words = []
+    for word in _WORD.findall(text):
+        words.extend(SYNONYMS.get(word, word).split())
+    return words
+
+
+def features(text: str) -> Dict[str, float]:
+    counts: Dict[str, float] = {}
+    for word in tokenize(text):
+        counts[word] = counts.get(word, 0.0) + 1.0
+        padded = f"<{word}>"
+        for start in range(len(padded) - 2):
+            trigram = "#" + padded[start:start + 3]
+            counts[trigram] = counts.get(trigram, 0.0) + TRIGRAM_WEIGHT
+    return counts
+
+
+def _slot(feature: str, dimensions: int) -> Tuple[int, float]:
+    # crc32 is stable across runs, unlike hash(); the top bit picks a sign so
+    # colliding features tend to cancel out instead of piling up.
+    digest = zlib.crc32(feature.encode('utf-8'))
+    return digest % dimensions, -1.0 if digest & 0x80000000 else 1.0
+
+
+def fingerprint(questions: Sequence[str], dimensions: int) -> str:
+    digest = hashlib.sha256(f"{INDEX_VERSION}:{dimensions}".encode())
+    for question in questions:
+        digest.update(question.encode('utf-8'))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class SemanticIndex:
+    # Every question is a row of one TF-IDF weighted, hashed bag-of-words matrix
+    # with unit-length rows, so scoring an utterance against the whole knowledge
+    # base is a single matrix-vector product of cosine similarities.
+    def __init__(self, vectors, idf, questions: Sequence[str], threshold: float = THRESHOLD):
+        if np is None:
+            raise ImportError("SemanticIndex needs numpy")
+        self.vectors = vectors
+        self.idf = idf
+        self.dimensions = len(idf)
+        self.threshold = threshold
+        self._questions: List[str] = list(questions)
+        self._added: List = []  # Rows for questions added since the matrix was built
+
+    @classmethod
+    def build(cls, questions: Sequence[str], dimensions: int = DIMENSIONS, threshold: float = THRESHOLD) -> "SemanticIndex":
+        if np is None:
+            raise ImportError("SemanticIndex needs numpy")
+        rows, slots, values = [], [], []
+        for row, question in enumerate(questions):
+            for feature, count in features(question).items():
+                slot, sign = _slot(feature, dimensions)
+                rows.append(row)
+                slots.append(slot)
+                values.append(sign * count)
+        rows, slots, values = np.array(rows, dtype=np.intp), np.array(slots, dtype=np.intp), np.array(values, dtype=np.float32)
+        # A slot counts once per question however many features landed in it
+        document_frequency = np.bincount(np.unique(rows * dimensions + slots) % dimensions, minlength=dimensions)
+        idf = (np.log((1 + len(questions)) / (1 + document_frequency)) + 1).astype(np.float32)
+        vectors = np.zeros((len(questions), dimensions), dtype=np.float32)
+        np.add.at(vectors, (rows, slots), values * idf[slots])
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.divide(vectors, norms, out=vectors, where=norms > 0)
+        return cls(vectors, idf, questions, threshold)
+
+    @classmethod
+    def open(cls, directory: str, questions: Sequence[str], dimensions: int = DIMENSIONS,
+             threshold: float = THRESHOLD) -> "SemanticIndex":
+        # Reuses the matrix saved in `directory` when it was built from the same
+        # questions, memory-mapped so startup doesn't read it all; otherwise it is
+        # rebuilt and saved for next time.
+        expected = fingerprint(questions, dimensions)
+        meta_path = os.path.join(directory, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, 'r') as file:
+                meta = json.load(file)
+            if meta.get("fingerprint") == expected:
+                vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode='r')
+                idf = np.load(os.path.join(directory, "idf.npy"))
+                return cls(vectors, idf, questions, threshold)
+            logging.info(f"Semantic index in {directory} is out of date, rebuilding")
+        index = cls.build(questions, dimensions, threshold)
+        index.save(directory, expected)
+        return index
+
+    def save(self, directory: str, expected: Optional[str] = None):
+        os.makedirs(directory, exist_ok=True)
+        vectors = self._matrix()
+        for name, array in (("vectors.npy", vectors), ("idf.npy", self.idf)):
+            with tempfile.NamedTemporaryFile(dir=directory, delete=False, suffix='.tmp') as file:
+                np.save(file, array)
+            os.replace(file.name, os.path.join(directory, name))
+        # meta.json goes last: until it names these questions the files are never trusted
+        meta = {"fingerprint": expected or fingerprint(self._questions, self.dimensions),
+                "dimensions": self.dimensions, "count": len(self._questions)}
+        with tempfile.NamedTemporaryFile('w', dir=directory, delete=False, suffix='.tmp') as file:
+            json.dump(meta, file)
+        os.replace(file.name, os.path.join(directory, "meta.json"))
+
+    def __len__(self) -> int:
+        return len(self._questions)
+
+    def embed(self, text: str):
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for feature, count in features(text).items():
+            slot, sign = _slot(feature, self.dimensions)
+            vector[slot] += sign * count * self.idf[slot]
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        return vector
+
+    def add(self, question: str):
+        # New questions keep the IDF weights of the original build until the next rebuild
+        self._questions.append(question)
+        self._added.append(self.embed(question))
+
+    def extend(self, questions: Iterable[str]):
+        for question in questions:
+            self.add(question)
+
+    def _matrix(self):
+        if not self._added:
+            return self.vectors
+        return np.vstack([self.vectors, np.stack(self._added)])
+
+    def scores(self, text: str):
+        query = self.embed(text)
+        scores = self.vectors @ query
+        if self._added:
+            scores = np.concatenate([scores, np.stack(self._added) @ query])
+        return scores
+
+    def similarity(self, text: str, question: str) -> float:
+        # Rows are embedded the same way, so this is the question's score in scores(text)
+        return float(self.embed(text) @ self.embed(question))
+
+    def search(self, text: str, k: int = 5) -> List[Tuple[str, float]]:
+        scores = self.scores(text)
+        if not len(scores):
+            return []
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        # Highest score first; the earlier question wins a tie, like the knowledge base index
+        top = top[np.lexsort((top, -scores[top]))]
+        return [(self._questions[row], float(scores[row])) for row in top]
+
+    def best_match(self, text: str, threshold: Optional[float] = None) -> Optional[str]:
+        threshold = self.threshold if threshold is None else threshold
+        matches = self.search(text, k=1)
+        if matches and matches[0][1] >= threshold:
+            return matches[0][0]
+        return None
+
+
+def load_semantic_index(directory: str, questions: Sequence[str], threshold: float = THRESHOLD) -> Optional[SemanticIndex]:
+    if np is None:
+        logging.info("numpy is not installed, semantic matching is off")
+        return None
+    return SemanticIndex.open(directory, questions, threshold=threshold)
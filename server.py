@@ -0,0 +1,275 @@
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import os
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple, Union
+from urllib.parse import parse_qs, urlsplit
+
+from core import QUERY_LIMIT, ChatEngine, Response, Session
+from intents import IntentRouter, load_intents
+from metrics import TRACER
+from remote import API_URL, APP_ID_ENV, RATE, WolframAlphaProvider
+from response_cache import ResponseCache
+from semantic import THRESHOLD, load_semantic_index
+from sharding import ShardedMatcher
+from storage import KnowledgeBaseStore
+
+SESSION_IDLE_TIMEOUT = 30 * 60
+MAX_BODY_BYTES = 64 * 1024
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+HTTP_STATUS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed"}
+
+
+class SessionStore:
+    def __init__(self, idle_timeout: float = SESSION_IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self._sessions: Dict[str, Session] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, session_id: Optional[str]) -> Tuple[Session, asyncio.Lock]:
+        self.expire()
+        session = self._sessions.get(session_id) if session_id else None
+        if session is None or session.ended:
+            session = Session(session_id)
+            self._sessions[session.id] = session
+            self._locks[session.id] = asyncio.Lock()
+        return session, self._locks[session.id]
+
+    def expire(self):
+        cutoff = time.time() - self.idle_timeout
+        for session_id in [key for key, session in self._sessions.items() if session.last_seen < cutoff]:
+            del self._sessions[session_id]
+            del self._locks[session_id]
+
+
+def response_payload(session: Session, response: Response) -> dict:
+    return {"session": session.id, "text": response.text, "intent": response.intent,
+            "url": response.url, "end_session": response.end_session}
+
+
+class ChatServer:
+    # Serves the engine over plain HTTP (POST /chat) and WebSocket (GET /ws). The
+    # knowledge base, response cache and query limit are shared by every session.
+    def __init__(self, engine: ChatEngine, workers: int = 16, idle_timeout: float = SESSION_IDLE_TIMEOUT):
+        self.engine = engine
+        self.sessions = SessionStore(idle_timeout)
+        # Remote lookups block, so turns run on a thread pool
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8000) -> int:
+        self.server = await asyncio.start_server(self.handle_connection, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        self.executor.shutdown(wait=False)
+
+    async def respond(self, text: str, session_id: Optional[str]) -> dict:
+        session, lock = self.sessions.get(session_id)
+        # Turns of one session run in order; different sessions run concurrently
+        async with lock:
+            loop = asyncio.get_running_loop()
+            response = await loop.run_in_executor(self.executor, self.traced_respond, text, session)
+        return response_payload(session, response)
+
+    def traced_respond(self, text: str, session: Session) -> Response:
+        with TRACER.turn():
+            return self.engine.respond(text, session)
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                    break
+                method, target, headers = parse_request_head(head)
+                url = urlsplit(target)
+                if headers.get("upgrade", "").lower() == "websocket" and url.path == "/ws":
+                    await self.handle_websocket(reader, writer, headers, parse_qs(url.query).get("session", [None])[0])
+                    break
+                keep_alive = headers.get("connection", "").lower() != "close"
+                status, payload = await self.handle_http(method, url.path, headers, reader)
+                write_http_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, ValueError) as e:
+            logging.warning(f"Dropping connection: {e}")
+        finally:
+            writer.close()
+
+    async def handle_http(self, method: str, path: str, headers: Dict[str, str],
+                          reader: asyncio.StreamReader) -> Tuple[int, Union[dict, str]]:
+        length = int(headers.get("content-length", 0))
+        if length > MAX_BODY_BYTES:
+            raise ValueError("request body too large")
+        body = await reader.readexactly(length) if length else b""
+
+        if path == "/health":
+            return 200, {"status": "ok", "sessions": len(self.sessions),
+                         "query_count": self.engine.query_count, "cache": self.engine.response_cache.stats}
+        if path == "/metrics":
+            return 200, TRACER.prometheus()
+        if path == "/metrics.json":
+            return 200, TRACER.to_json()
+        if path != "/chat":
+            return 404, {"error": "not found"}
+        if method != "POST":
+            return 405, {"error": "use POST"}
+        try:
+            request = json.loads(body or b"{}")
+            text = request["text"]
+        except (ValueError, KeyError, TypeError):
+            return 400, {"error": "expected a JSON body with a \"text\" field"}
+        return 200, await self.respond(str(text), request.get("session"))
+
+    async def handle_websocket(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                               headers: Dict[str, str], session_id: Optional[str]):
+        key = headers.get("sec-websocket-key")
+        if not key:
+            write_http_response(writer, 400, {"error": "missing Sec-WebSocket-Key"}, keep_alive=False)
+            await writer.drain()
+            return
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest())
+        writer.write(b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                     b"Sec-WebSocket-Accept: " + accept + b"\r\n\r\n")
+        await writer.drain()
+        while True:
+            try:
+                opcode, data = await read_websocket_frame(reader)
+            except asyncio.IncompleteReadError:
+                return
+            if opcode == 0x8:  # close
+                writer.write(websocket_frame(data[:2], 0x8))
+                await writer.drain()
+                return
+            if opcode == 0x9:  # ping
+                writer.write(websocket_frame(data, 0xA))
+            elif opcode == 0x1:
+                payload = await self.respond(data.decode('utf-8'), session_id)
+                session_id = payload["session"]
+                writer.write(websocket_frame(json.dumps(payload).encode('utf-8')))
+            await writer.drain()
+
+
+def parse_request_head(head: bytes) -> Tuple[str, str, Dict[str, str]]:
+    lines = head.decode('latin-1').split("\r\n")
+    method, target, _ = lines[0].split(" ", 2)
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    return method, target, headers
+
+
+def write_http_response(writer: asyncio.StreamWriter, status: int, payload: Union[dict, str], keep_alive: bool):
+    # Text payloads are Prometheus exposition format, everything else is JSON
+    if isinstance(payload, str):
+        body, content_type = payload.encode('utf-8'), "text/plain; version=0.0.4"
+    else:
+        body, content_type = json.dumps(payload).encode('utf-8'), "application/json"
+    writer.write(f"HTTP/1.1 {status} {HTTP_STATUS[status]}\r\nContent-Type: {content_type}\r\n"
+                 f"Content-Length: {len(body)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+                 .encode('latin-1') + body)
+
+
+async def read_websocket_frame(reader: asyncio.StreamReader) -> Tuple[int, bytes]:
+    first, second = await reader.readexactly(2)
+    opcode = first & 0x0F
+    length = second & 0x7F
+    if length == 126:
+        length = struct.unpack("!H", await reader.readexactly(2))[0]
+    elif length == 127:
+        length = struct.unpack("!Q", await reader.readexactly(8))[0]
+    if length > MAX_BODY_BYTES:
+        raise ValueError("websocket frame too large")
+    mask = await reader.readexactly(4) if second & 0x80 else b""
+    data = await reader.readexactly(length)
+    if mask:
+        data = bytes(byte ^ mask[position % 4] for position, byte in enumerate(data))
+    return opcode, data
+
+
+def websocket_frame(data: bytes, opcode: int = 0x1, mask: bytes = b"") -> bytes:
+    header = bytes([0x80 | opcode])
+    mask_bit = 0x80 if mask else 0
+    if len(data) < 126:
+        header += bytes([mask_bit | len(data)])
+    elif len(data) < 1 << 16:
+        header += bytes([mask_bit | 126]) + struct.pack("!H", len(data))
+    else:
+        header += bytes([mask_bit | 127]) + struct.pack("!Q", len(data))
+    if mask:
+        data = bytes(byte ^ mask[position % 4] for position, byte in enumerate(data))
+    return header + mask + data
+
+
+async def serve(engine: ChatEngine, host: str, port: int, workers: int):
+    server = ChatServer(engine, workers)
+    port = await server.start(host, port)
+    logging.info(f"ELEY server listening on http://{host}:{port} (POST /chat, GET /ws)")
+    try:
+        await server.server.serve_forever()
+    finally:
+        await server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve ELEY to many concurrent sessions over HTTP and WebSocket")
+    parser.add_argument("--host", default='127.0.0.1')
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--app-id", default=os.environ.get(APP_ID_ENV),
+                        help=f"Wolfram Alpha App ID, by default from ${APP_ID_ENV}")
+    parser.add_argument("--wolfram-url", default=API_URL)
+    parser.add_argument("--rate", type=float, default=RATE, help="Wolfram Alpha requests per second")
+    parser.add_argument("--knowledge-base", default="knowledge_base.json")
+    parser.add_argument("--mmap-answers", action="store_true",
+                        help="keep answers in a memory-mapped <knowledge base>.answers file, for very large ones")
+    parser.add_argument("--query-limit", type=int, default=QUERY_LIMIT)
+    parser.add_argument("--intents", default="intents.json", help="JSON file of extra intents")
+    parser.add_argument("--semantic-index", default="semantic_index", help="directory of the semantic index")
+    parser.add_argument("--semantic-threshold", type=float, default=THRESHOLD)
+    parser.add_argument("--match-processes", type=int, default=0,
+                        help="spread fuzzy matching over this many processes, for very large knowledge bases")
+    args = parser.parse_args()
+    if not args.app_id:
+        parser.error(f"set {APP_ID_ENV} or pass --app-id")
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    # Through the store, so answers other processes taught (still in the log) are included
+    knowledge_base = KnowledgeBaseStore(args.knowledge_base,
+                                        answers_path=args.knowledge_base + ".answers" if args.mmap_answers
+                                        else None).load()
+    semantic_index = load_semantic_index(args.semantic_index, knowledge_base.questions, args.semantic_threshold)
+    client = WolframAlphaProvider(args.app_id, args.wolfram_url, rate=args.rate)
+    matcher = None
+    if args.match_processes:
+        matcher = ShardedMatcher(knowledge_base.questions, args.match_processes,
+                                 knowledge_base.matcher.cutoff).start()
+    engine = ChatEngine(knowledge_base, client, ResponseCache("response_cache.json"), args.query_limit,
+                        "query_count.json", IntentRouter(load_intents(args.intents)), semantic_index, matcher=matcher)
+    try:
+        asyncio.run(serve(engine, args.host, args.port, args.workers))
+    finally:
+        if matcher is not None:
+            matcher.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+import heapq
+import multiprocessing
+import os
+import threading
+from array import array
+from multiprocessing import shared_memory
+from multiprocessing.connection import Connection
+from typing import List, Optional, Sequence, Tuple
+
+from matcher import FuzzyMatcher
+
+# Shared memory layout: question count, count + 1 offsets into the text, then
+# every question as UTF-8. Each worker reads its slice of it once at startup.
+_WORD = array('Q').itemsize
+
+
+def _write_questions(questions: Sequence[str]) -> shared_memory.SharedMemory:
+    encoded = [question.encode('utf-8') for question in questions]
+    offsets = array('Q', [0])
+    for text in encoded:
+        offsets.append(offsets[-1] + len(text))
+    header = (len(offsets) + 1) * _WORD
+    block = shared_memory.SharedMemory(create=True, size=max(1, header + offsets[-1]))
+    block.buf[:_WORD] = array('Q', [len(encoded)]).tobytes()
+    block.buf[_WORD:header] = offsets.tobytes()
+    block.buf[header:header + offsets[-1]] = b"".join(encoded)
+    return block
+
+
+def _read_questions(buffer: memoryview, start: int, stop: int) -> List[str]:
+    count = buffer[:_WORD].cast('Q')[0]
+    header = (count + 2) * _WORD
+    offsets = buffer[_WORD:header].cast('Q')
+    try:
+        return [bytes(buffer[header + offsets[index]:header + offsets[index + 1]]).decode('utf-8')
+                for index in range(start, stop)]
+    finally:
+        offsets.release()
+
+
+def _serve(connection: Connection, name: str, start: int, stop: int, cutoff: float):
+    # One shard per process, so every worker indexes only its own questions
+    # Spawned workers share the parent's resource tracker, so attaching here
+    # doesn't make this process responsible for removing the block
+    block = shared_memory.SharedMemory(name=name)
+    matcher = FuzzyMatcher(_read_questions(block.buf, start, stop), cutoff)
+    block.close()
+    connection.send(len(matcher))
+    while True:
+        request = connection.recv()
+        if request is None:
+            return
+        word, n = request
+        try:
+            connection.send(matcher.scored_matches(word, n))
+        except Exception as e:
+            connection.send(e)
+
+
+class ShardedMatcher:
+    # FuzzyMatcher's matching spread over worker processes, for knowledge bases
+    # where one match keeps a core busy for tens of milliseconds. The questions
+    # are split into one contiguous shard per process and handed over through
+    # shared memory; a query sends each worker only the word and gets back its
+    # top n (score, question) pairs, and their top n is exactly what
+    # FuzzyMatcher would have returned, ties included.
+    #
+    # questions may be the knowledge base's live list: questions added after
+    # start() are matched in this process and merged the same way. Queries from
+    # several threads take turns, each one using every worker.
+    def __init__(self, questions: Sequence[str], processes: Optional[int] = None, cutoff: float = 0.6):
+        if not 0.0 <= cutoff <= 1.0:
+            raise ValueError(f"cutoff must be in [0.0, 1.0]: {cutoff!r}")
+        self.questions = questions
+        self.processes = processes or os.cpu_count() or 1
+        self.cutoff = cutoff
+        self._connections: List[Connection] = []
+        self._workers: List[multiprocessing.Process] = []
+        self._sharded = 0
+        self._tail = FuzzyMatcher(cutoff=cutoff)
+        self._lock = threading.Lock()
+
+    def start(self) -> "ShardedMatcher":
+        if self._workers:
+            return self
+        # spawn: forking a process with threads running (the learner, the server's pool) isn't safe
+        context = multiprocessing.get_context("spawn")
+        self._sharded = len(self.questions)
+        block = _write_questions(self.questions[:self._sharded])
+        try:
+            bounds = [self._sharded * shard // self.processes for shard in range(self.processes + 1)]
+            for start, stop in zip(bounds, bounds[1:]):
+                parent, child = context.Pipe()
+                worker = context.Process(target=_serve, args=(child, block.name, start, stop, self.cutoff),
+                                         name=f"matcher-{start}-{stop}", daemon=True)
+                worker.start()
+                child.close()
+                self._connections.append(parent)
+                self._workers.append(worker)
+            # Every worker has its copy once it answers, so the block can go
+            for connection in self._connections:
+                connection.recv()
+        except BaseException:
+            self.close()
+            raise
+        finally:
+            block.close()
+            block.unlink()
+        return self
+
+    def close(self):
+        for connection in self._connections:
+            try:
+                connection.send(None)
+            except OSError:
+                pass
+            connection.close()
+        for worker in self._workers:
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+        self._connections = []
+        self._workers = []
+
+    def __enter__(self) -> "ShardedMatcher":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.questions)
+
+    def scored_matches(self, word: str, n: int = 1) -> List[Tuple[float, str]]:
+        if not n > 0:
+            raise ValueError(f"n must be > 0: {n!r}")
+        with self._lock:
+            for connection in self._connections:
+                connection.send((word, n))
+            # The newest questions are matched here while the workers run
+            for question in self.questions[self._sharded + len(self._tail):]:
+                self._tail.add(question)
+            results = self._tail.scored_matches(word, n)
+            # Every reply is read, even after an error, so the next query gets its own
+            replies = [connection.recv() for connection in self._connections]
+        for found in replies:
+            if isinstance(found, Exception):
+                raise found
+            results += found
+        return heapq.nlargest(n, results)
+
+    def close_matches(self, word: str, n: int = 1) -> List[str]:
+        return [question for score, question in self.scored_matches(word, n)]
+
+    def best_match(self, word: str) -> Optional[str]:
+        matches = self.close_matches(word, n=1)
+        return matches[0] if matches else None
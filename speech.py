@@ -0,0 +1,418 @@
+import argparse
+import array
+import collections
+import json
+import math
+import operator
+import sys
+import threading
+import time
+import wave
+from typing import Deque, Dict, List, NamedTuple, Optional, Tuple, Type
+
+SAMPLE_RATE = 16000
+FRAME_MS = 30
+PRE_ROLL = 0.3  # Seconds of audio kept from just before speech was detected
+START_SPEECH = 0.09  # Voiced audio needed to start an utterance, so clicks are ignored
+END_SILENCE = 0.5  # Quiet that ends an utterance; speech_recognition waits 0.8 s
+MAX_UTTERANCE = 15.0
+RING_SECONDS = 5.0  # Audio buffered while nobody is listening, e.g. during a reply
+VOSK_MODEL_PATH = "vosk-model"
+
+
+class RecognitionError(Exception):
+    pass
+
+
+class Utterance(NamedTuple):
+    text: str
+    seconds: float  # Audio handed to the recognizer
+    speech_end: float  # perf_counter() when the last voiced frame was captured
+    finished: float  # perf_counter() when the text was ready
+
+    @property
+    def latency(self) -> float:
+        return self.finished - self.speech_end
+
+
+class AudioSource:
+    # 16-bit mono PCM, one frame per read(); None once the audio has ended. A
+    # live source keeps talking whether or not anyone listens; any other is
+    # only read as fast as its frames are used.
+    sample_rate = SAMPLE_RATE
+    frame_samples = SAMPLE_RATE * FRAME_MS // 1000
+    live = True
+
+    def read(self) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MicrophoneSource(AudioSource):
+    # Opened once for the whole session rather than once per turn
+    def __init__(self, sample_rate: int = SAMPLE_RATE, frame_ms: int = FRAME_MS, device_index: Optional[int] = None):
+        import speech_recognition as sr
+
+        self.sample_rate = sample_rate
+        self.frame_samples = sample_rate * frame_ms // 1000
+        self.microphone = sr.Microphone(device_index=device_index, sample_rate=sample_rate,
+                                        chunk_size=self.frame_samples)
+        self.stream = self.microphone.__enter__().stream
+
+    def read(self) -> Optional[bytes]:
+        return self.stream.read(self.frame_samples)
+
+    def close(self):
+        self.microphone.__exit__(None, None, None)
+
+
+class WavSource(AudioSource):
+    # Replays a WAV file like a microphone would deliver it: each frame once all
+    # of it has "been spoken", or as fast as possible with realtime=False.
+    def __init__(self, path: str, frame_ms: int = FRAME_MS, realtime: bool = True):
+        self.wav = wave.open(path, 'rb')
+        if self.wav.getsampwidth() != 2 or self.wav.getnchannels() != 1:
+            self.wav.close()
+            raise ValueError(f"{path}: expected 16-bit mono audio")
+        self.sample_rate = self.wav.getframerate()
+        self.frame_samples = self.sample_rate * frame_ms // 1000
+        self.realtime = realtime
+        self.live = realtime
+        self.started: Optional[float] = None
+        self.position = 0  # Samples read so far
+
+    def read(self) -> Optional[bytes]:
+        if self.started is None:
+            self.started = time.perf_counter()
+        frame = self.wav.readframes(self.frame_samples)
+        if not frame:
+            return None
+        self.position += len(frame) // 2
+        if self.realtime:
+            delay = self.started + self.position / self.sample_rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        return frame.ljust(self.frame_samples * 2, b'\x00')
+
+    def close(self):
+        self.wav.close()
+
+
+def frame_rms(frame: bytes) -> float:
+    samples = array.array('h', frame)
+    if sys.byteorder == 'big':
+        samples.byteswap()
+    if not samples:
+        return 0.0
+    return math.sqrt(sum(map(operator.mul, samples, samples)) / len(samples))
+
+
+class VAD:
+    name = "base"
+
+    def is_speech(self, frame: bytes, sample_rate: int) -> bool:
+        raise NotImplementedError
+
+
+class EnergyVAD(VAD):
+    # A frame is speech when it is well above a running estimate of the room's
+    # background level. The estimate follows a quieter room quickly and a louder
+    # one slowly, and it carries over from turn to turn, so there is no
+    # recalibration each time listening starts.
+    name = "energy"
+
+    def __init__(self, ratio: float = 3.0, min_rms: float = 100.0, attack: float = 0.02, release: float = 0.3):
+        self.ratio = ratio
+        self.min_rms = min_rms
+        self.attack = attack
+        self.release = release
+        self.noise: Optional[float] = None
+
+    def is_speech(self, frame: bytes, sample_rate: int) -> bool:
+        rms = frame_rms(frame)
+        if self.noise is None:
+            self.noise = rms
+        speech = rms > max(self.min_rms, self.noise * self.ratio)
+        if rms < self.noise:
+            self.noise += (rms - self.noise) * self.release
+        else:
+            # Creep up even during "speech" so a sudden steady noise (a fan) is learned eventually
+            self.noise += (rms - self.noise) * (self.attack * 0.05 if speech else self.attack)
+        return speech
+
+
+class WebRTCVAD(VAD):
+    # Needs the webrtcvad package; frames must be 10, 20 or 30 ms long
+    name = "webrtc"
+
+    def __init__(self, aggressiveness: int = 2):
+        import webrtcvad
+
+        self.vad = webrtcvad.Vad(aggressiveness)
+
+    def is_speech(self, frame: bytes, sample_rate: int) -> bool:
+        return self.vad.is_speech(frame, sample_rate)
+
+
+VADS: Dict[str, Type[VAD]] = {
+    EnergyVAD.name: EnergyVAD,
+    WebRTCVAD.name: WebRTCVAD,
+}
+
+
+class RecognitionStream:
+    def accept(self, frame: bytes):
+        raise NotImplementedError
+
+    def result(self) -> str:
+        raise NotImplementedError
+
+
+class RecognizerBackend:
+    name = "base"
+    streaming = False  # Whether audio is decoded while the user is still speaking
+
+    def stream(self, sample_rate: int) -> RecognitionStream:
+        raise NotImplementedError
+
+
+class BufferedStream(RecognitionStream):
+    # For recognizers that only take whole clips
+    def __init__(self, recognize, sample_rate: int):
+        self.recognize = recognize
+        self.sample_rate = sample_rate
+        self.frames: List[bytes] = []
+
+    def accept(self, frame: bytes):
+        self.frames.append(frame)
+
+    def result(self) -> str:
+        return self.recognize(b"".join(self.frames), self.sample_rate)
+
+
+class GoogleBackend(RecognizerBackend):
+    # The Google Web Speech API that get_speech_input has always used. It only
+    # takes whole clips, so all of the decoding happens after the endpoint.
+    name = "google"
+
+    def __init__(self, language: str = 'en-US'):
+        import speech_recognition as sr
+
+        self.sr = sr
+        self.recognizer = sr.Recognizer()
+        self.language = language
+
+    def stream(self, sample_rate: int) -> RecognitionStream:
+        return BufferedStream(self.recognize, sample_rate)
+
+    def recognize(self, audio: bytes, sample_rate: int) -> str:
+        try:
+            return self.recognizer.recognize_google(self.sr.AudioData(audio, sample_rate, 2), language=self.language)
+        except self.sr.UnknownValueError:
+            return ""
+        except self.sr.RequestError as e:
+            raise RecognitionError(str(e)) from e
+
+
+class VoskStream(RecognitionStream):
+    def __init__(self, recognizer):
+        self.recognizer = recognizer
+        self.segments: List[str] = []
+
+    def accept(self, frame: bytes):
+        if self.recognizer.AcceptWaveform(frame):
+            # Vosk closes segments at pauses of its own; keep them for the final text
+            self.segments.append(json.loads(self.recognizer.Result()).get("text", ""))
+
+    def result(self) -> str:
+        self.segments.append(json.loads(self.recognizer.FinalResult()).get("text", ""))
+        return " ".join(segment for segment in self.segments if segment)
+
+
+class VoskBackend(RecognizerBackend):
+    # Offline and incremental: each frame is decoded as it arrives, so only the
+    # last moments of speech are left to decode once the user stops talking.
+    # Models are downloaded separately, see https://alphacephei.com/vosk/models
+    name = "vosk"
+    streaming = True
+
+    def __init__(self, model_path: str = VOSK_MODEL_PATH):
+        import vosk
+
+        self.vosk = vosk
+        self.model = vosk.Model(model_path)
+
+    def stream(self, sample_rate: int) -> RecognitionStream:
+        return VoskStream(self.vosk.KaldiRecognizer(self.model, sample_rate))
+
+
+BACKENDS: Dict[str, Type[RecognizerBackend]] = {
+    GoogleBackend.name: GoogleBackend,
+    VoskBackend.name: VoskBackend,
+}
+
+
+def make_backend(name: str, model_path: str = VOSK_MODEL_PATH) -> RecognizerBackend:
+    return VoskBackend(model_path) if name == VoskBackend.name else BACKENDS[name]()
+
+
+class SpeechFrontEnd:
+    # One capture thread reads the source into a ring buffer for the whole
+    # session. listen() runs the VAD over buffered frames, feeds speech to the
+    # recognizer while it is still being spoken and returns once END_SILENCE of
+    # quiet follows it.
+    def __init__(self, source: AudioSource, backend: RecognizerBackend, vad: Optional[VAD] = None,
+                 pre_roll: float = PRE_ROLL, start_speech: float = START_SPEECH, end_silence: float = END_SILENCE,
+                 max_utterance: float = MAX_UTTERANCE, ring_seconds: float = RING_SECONDS):
+        self.source = source
+        self.backend = backend
+        self.vad = vad or EnergyVAD()
+        self.frame_seconds = source.frame_samples / source.sample_rate
+        self.pre_roll_frames = max(1, round(pre_roll / self.frame_seconds))
+        self.start_frames = max(1, round(start_speech / self.frame_seconds))
+        self.end_frames = max(1, round(end_silence / self.frame_seconds))
+        self.max_frames = round(max_utterance / self.frame_seconds)
+        self.ring: Deque[Tuple[float, bytes]] = collections.deque(
+            maxlen=max(self.pre_roll_frames + self.start_frames, round(ring_seconds / self.frame_seconds)))
+        self.dropped = 0
+        self.ended = False
+        self.latencies: List[float] = []
+        self._available = threading.Condition()
+        self._listening = threading.Lock()
+        self._closed = False
+        self._muted = False
+
+    def start(self) -> "SpeechFrontEnd":
+        threading.Thread(target=self._capture, daemon=True).start()
+        return self
+
+    def close(self):
+        # The capture thread closes the source after its current read
+        with self._available:
+            self._closed = True
+            self._available.notify_all()
+
+    def mute(self):
+        # Until unmute(), what the microphone hears is thrown away, so a reply
+        # playing through the speakers can't be taken for the user's next turn
+        with self._available:
+            self._muted = True
+            if self.source.live:
+                self.ring.clear()
+
+    def unmute(self):
+        with self._available:
+            self._muted = False
+
+    def _capture(self):
+        try:
+            while not self._closed:
+                try:
+                    frame = self.source.read()
+                except OSError:
+                    break
+                if frame is None:
+                    break
+                with self._available:
+                    if self._muted and self.source.live:
+                        continue
+                    while not self.source.live and len(self.ring) == self.ring.maxlen and not self._closed:
+                        self._available.wait()
+                    if len(self.ring) == self.ring.maxlen:
+                        self.dropped += 1
+                    self.ring.append((time.perf_counter(), frame))
+                    self._available.notify()
+        finally:
+            with self._available:
+                self.ended = True
+                self._available.notify_all()
+            self.source.close()
+
+    def _next_frame(self, deadline: Optional[float]) -> Optional[Tuple[float, bytes]]:
+        with self._available:
+            while not self.ring:
+                if self.ended:
+                    raise EOFError("audio source ended")
+                remaining = None if deadline is None else deadline - time.perf_counter()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._available.wait(remaining)
+            item = self.ring.popleft()
+            self._available.notify_all()
+            return item
+
+    def listen(self, timeout: Optional[float] = None) -> Optional[Utterance]:
+        # None if nobody started speaking within timeout seconds; EOFError once
+        # the source has run out. Recognition errors propagate as RecognitionError.
+        with self._listening:
+            if self.source.live:
+                with self._available:
+                    # Audio from before this call (ELEY's own voice, say) is dropped,
+                    # apart from the pre-roll that may hold the start of a word
+                    while len(self.ring) > self.pre_roll_frames:
+                        self.ring.popleft()
+            deadline = None if timeout is None else time.perf_counter() + timeout
+            pending: Deque[Tuple[float, bytes]] = collections.deque(maxlen=self.pre_roll_frames + self.start_frames)
+            voiced = 0
+            while voiced < self.start_frames:
+                item = self._next_frame(deadline)
+                if item is None:
+                    return None
+                pending.append(item)
+                voiced = voiced + 1 if self.vad.is_speech(item[1], self.source.sample_rate) else 0
+            return self._recognize(pending)
+
+    def _recognize(self, pending: Deque[Tuple[float, bytes]]) -> Utterance:
+        stream = self.backend.stream(self.source.sample_rate)
+        for _, frame in pending:
+            stream.accept(frame)
+        frames = len(pending)
+        speech_end = pending[-1][0]
+        silent = 0
+        while silent < self.end_frames and frames < self.max_frames:
+            try:
+                captured, frame = self._next_frame(None)
+            except EOFError:
+                break
+            stream.accept(frame)
+            frames += 1
+            if self.vad.is_speech(frame, self.source.sample_rate):
+                silent = 0
+                speech_end = captured
+            else:
+                silent += 1
+        text = stream.result()
+        finished = time.perf_counter()
+        self.latencies.append(finished - speech_end)
+        return Utterance(text, frames * self.frame_seconds, speech_end, finished)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Transcribe a 16-bit mono WAV file utterance by utterance")
+    parser.add_argument("command", choices=["transcribe"])
+    parser.add_argument("wav")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default=VoskBackend.name)
+    parser.add_argument("--model", default=VOSK_MODEL_PATH, help="Vosk model directory")
+    parser.add_argument("--vad", choices=sorted(VADS), default=EnergyVAD.name)
+    parser.add_argument("--end-silence", type=float, default=END_SILENCE)
+    parser.add_argument("--fast", action="store_true", help="read the file as fast as possible, not in real time")
+    args = parser.parse_args()
+
+    source = WavSource(args.wav, realtime=not args.fast)
+    front_end = SpeechFrontEnd(source, make_backend(args.backend, args.model), VADS[args.vad](),
+                               end_silence=args.end_silence).start()
+    try:
+        while True:
+            utterance = front_end.listen()
+            print(f"{utterance.speech_end - source.started:7.2f} s  +{utterance.latency * 1000:5.0f} ms  "
+                  f"{utterance.text!r}")
+    except EOFError:
+        pass
+    finally:
+        front_end.close()
+
+
+if __name__ == '__main__':
+    main()
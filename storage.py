@@ -0,0 +1,338 @@
+import json
+import logging
+import os
+import pickle
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from knowledge_base import KnowledgeBase
+
+try:
+    import fcntl
+except ImportError:  # Windows: locking falls back to threads of this process only
+    fcntl = None
+
+COMPACT_EVERY = 1000  # Log records replayed on load before they are folded into the JSON file
+SEQ_KEY = "wal_seq"
+SNAPSHOT_VERSION = 3
+
+
+class WriteAheadLog:
+    # Changes to a JSON file are appended to <file>.log as one JSON line each and
+    # folded back into the file by compact(). Every record has a sequence number
+    # and the file remembers the last one it contains, so a crash at any point
+    # never loses or double-applies a change. An flock on <file>.lock serializes
+    # writers across processes.
+    def __init__(self, file_path: str, fsync: bool = True):
+        self.file_path = file_path
+        self.log_path = file_path + ".log"
+        self.lock_path = file_path + ".lock"
+        self.fsync = fsync
+        self._thread_lock = threading.RLock()
+
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        with self._thread_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.lock_path, 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def read_base(self) -> Optional[dict]:
+        if not os.path.exists(self.file_path):
+            return None
+        with open(self.file_path, 'r') as file:
+            return json.load(file)
+
+    def read_records(self, after: int = 0) -> List[dict]:
+        records = []
+        if not os.path.exists(self.log_path):
+            return records
+        with open(self.log_path, 'r') as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break  # Torn final line from a crash mid-append
+                if record["seq"] > after:
+                    records.append(record)
+        return records
+
+    def _last_record(self, log_file) -> Tuple[Optional[dict], int]:
+        # Returns the last complete record and the offset just past it
+        size = log_file.seek(0, os.SEEK_END)
+        block = 4096
+        while True:
+            start = max(0, size - block)
+            log_file.seek(start)
+            tail = log_file.read(size - start)
+            end = tail.rfind(b"\n")
+            if end >= 0:
+                previous = tail.rfind(b"\n", 0, end)
+                if previous >= 0 or start == 0:
+                    line = tail[previous + 1:end]
+                    return json.loads(line), start + end + 1
+            if start == 0:
+                return None, 0
+            block *= 2
+
+    def _tail(self, log_file) -> Tuple[Optional[dict], Optional[dict]]:
+        # Returns the last record, or the base file if the log has none. Call with the lock held.
+        last, end = self._last_record(log_file)
+        if end != log_file.tell():
+            log_file.truncate(end)  # Drop a torn final line before appending
+        return last, self.read_base() if last is None else None
+
+    def _write(self, log_file, last: Optional[dict], base: Optional[dict], records: List[dict]):
+        seq = last["seq"] if last else (base or {}).get(SEQ_KEY, 0)
+        for record in records:
+            seq += 1
+            record["seq"] = seq
+        log_file.write("".join(json.dumps(record) + "\n" for record in records).encode('utf-8'))
+        log_file.flush()
+        if self.fsync:
+            os.fsync(log_file.fileno())
+
+    def append(self, make_record: Callable[[Optional[dict], Optional[dict]], Optional[dict]]) -> Optional[dict]:
+        # make_record(last_record, base) builds the next record while the lock is
+        # held, so read-modify-write updates like counters stay consistent.
+        with self.locked():
+            with open(self.log_path, 'a+b') as log_file:
+                last, base = self._tail(log_file)
+                record = make_record(last, base)
+                if record is None:
+                    return None
+                self._write(log_file, last, base, [record])
+            return record
+
+    def extend(self, records: List[dict]) -> List[dict]:
+        # Several records in one write and one fsync
+        if records:
+            with self.locked():
+                with open(self.log_path, 'a+b') as log_file:
+                    last, base = self._tail(log_file)
+                    self._write(log_file, last, base, records)
+        return records
+
+    def compact(self, apply: Callable[[dict, dict], None], empty: dict,
+                checkpoint: Callable[[dict], dict] = lambda data: {}) -> int:
+        with self.locked():
+            data = self.read_base() or empty
+            records = self.read_records(after=data.get(SEQ_KEY, 0))
+            if not records:
+                return 0
+            for record in records:
+                apply(data, record)
+            data[SEQ_KEY] = records[-1]["seq"]
+            write_json_atomic(self.file_path, data, self.fsync)
+            # Records up to SEQ_KEY are in the file now, so a crash before the log
+            # is replaced only leaves records that replay skips. The checkpoint
+            # record keeps the sequence going without re-reading the JSON file.
+            record = dict(checkpoint(data), op="checkpoint", seq=data[SEQ_KEY])
+            write_text_atomic(self.log_path, json.dumps(record) + "\n", self.fsync)
+            return len(records)
+
+    def start_log(self, seq: int):
+        # Seeds an empty log with a checkpoint so appends never need to parse the
+        # JSON file to find the next sequence number. Call with the lock held.
+        if not os.path.exists(self.log_path) or os.path.getsize(self.log_path) == 0:
+            write_text_atomic(self.log_path, json.dumps({"op": "checkpoint", "seq": seq}) + "\n", self.fsync)
+
+    def log_records(self) -> int:
+        return len(self.read_records())
+
+
+def write_bytes_atomic(file_path: str, data: bytes, fsync: bool = True):
+    directory = os.path.dirname(os.path.abspath(file_path))
+    with tempfile.NamedTemporaryFile('wb', dir=directory, delete=False, suffix='.tmp') as file:
+        file.write(data)
+        file.flush()
+        if fsync:
+            os.fsync(file.fileno())
+    os.replace(file.name, file_path)
+
+
+def write_text_atomic(file_path: str, text: str, fsync: bool = True):
+    write_bytes_atomic(file_path, text.encode('utf-8'), fsync)
+
+
+def write_json_atomic(file_path: str, data: dict, fsync: bool = True):
+    write_text_atomic(file_path, json.dumps(data, indent=2), fsync)
+
+
+def _apply_count_record(data: dict, record: dict):
+    if record["op"] == "set":
+        data["query_count"] = record["value"]
+
+
+def _apply_knowledge_record(data: dict, record: dict):
+    if record["op"] == "add":
+        data.setdefault("questions", []).append({"question": record["question"], "answer": record["answer"]})
+    elif record["op"] == "replace":
+        for entry in data.get("questions", []):
+            if entry["question"] == record["question"]:
+                entry["answer"] = record["answer"]
+                break
+
+
+def _apply_knowledge_change(knowledge_base: KnowledgeBase, record: dict):
+    if record["op"] == "add":
+        knowledge_base.add(record["question"], record["answer"])
+    elif record["op"] == "replace":
+        knowledge_base.set_answer(record["question"], record["answer"])
+
+
+def _owned_by_us(path: str) -> bool:
+    # Ours and not group- or world-writable; Windows has no owner ids to compare
+    if not hasattr(os, "getuid"):
+        return True
+    stat = os.stat(path)
+    return stat.st_uid == os.getuid() and not stat.st_mode & 0o022
+
+
+class KnowledgeBaseStore:
+    # With snapshot=True the built KnowledgeBase (entries plus matcher index) is
+    # pickled to <file>.snapshot and reused while the JSON file is unchanged,
+    # which loads about 3x faster than parsing JSON and indexing every question.
+    # Unpickling runs code, so a snapshot is only read if it is ours and nobody
+    # else can write it; keep the knowledge base out of shared directories.
+    def __init__(self, file_path: str, compact_every: int = COMPACT_EVERY, fsync: bool = True,
+                 snapshot: bool = True, **options):
+        self.log = WriteAheadLog(file_path, fsync)
+        self.compact_every = compact_every
+        self.snapshot_path = file_path + ".snapshot" if snapshot else None
+        self.options = options
+        self._pending = 0
+
+    def _base_stamp(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.log.file_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def _read_snapshot(self, stamp: Optional[Tuple[int, int]]) -> Optional[KnowledgeBase]:
+        if self.snapshot_path is None or stamp is None or not os.path.exists(self.snapshot_path):
+            return None
+        if not _owned_by_us(self.snapshot_path):
+            logging.warning(f"Ignoring {self.snapshot_path}: another user could have written it")
+            return None
+        try:
+            with open(self.snapshot_path, 'rb') as file:
+                snapshot = pickle.load(file)
+        except Exception as e:  # Written by an older version of the code, or torn
+            logging.info(f"Ignoring knowledge base snapshot: {e}")
+            return None
+        if (snapshot.get("version") != SNAPSHOT_VERSION or snapshot.get("stamp") != stamp
+                or snapshot.get("options") != self.options):
+            return None
+        return snapshot["knowledge_base"]
+
+    def load(self) -> KnowledgeBase:
+        with self.log.locked():
+            stamp = self._base_stamp()
+            knowledge_base = self._read_snapshot(stamp)
+            if knowledge_base is None:
+                data = self.log.read_base() or {"questions": []}
+                knowledge_base = KnowledgeBase(data, **self.options)
+                if self.snapshot_path is not None and stamp is not None:
+                    snapshot = {"version": SNAPSHOT_VERSION, "stamp": stamp, "options": self.options,
+                                "knowledge_base": knowledge_base}
+                    write_bytes_atomic(self.snapshot_path, pickle.dumps(snapshot, pickle.HIGHEST_PROTOCOL),
+                                       self.log.fsync)
+            seq = knowledge_base.data.get(SEQ_KEY, 0)
+            records = self.log.read_records(after=seq)
+            self.log.start_log(seq)
+        for record in records:
+            _apply_knowledge_change(knowledge_base, record)
+        if records:
+            knowledge_base.data[SEQ_KEY] = records[-1]["seq"]
+        self._pending = len(records)
+        return knowledge_base
+
+    def add(self, knowledge_base: KnowledgeBase, question: str, answer: str):
+        self.write(knowledge_base, [{"op": "add", "question": question, "answer": answer}])
+
+    def replace(self, knowledge_base: KnowledgeBase, question: str, answer: str):
+        # Logged with the question as the knowledge base has it, which compact() looks for in the JSON file
+        stored = knowledge_base.stored_question(question)
+        if stored is None:
+            raise KeyError(question)
+        self.write(knowledge_base, [{"op": "replace", "question": stored, "answer": answer}])
+
+    def write(self, knowledge_base: KnowledgeBase, changes: List[dict]):
+        # "add" and "replace" records, logged together and then applied in order
+        if not changes:
+            return
+        records = self.log.extend(changes)
+        for record in records:
+            _apply_knowledge_change(knowledge_base, record)
+        knowledge_base.data[SEQ_KEY] = records[-1]["seq"]
+        self._pending += len(records)
+        if self._pending >= self.compact_every:
+            self.compact()
+
+    def compact(self):
+        self.log.compact(_apply_knowledge_record, {"questions": []})
+        self._pending = 0
+
+
+class QueryCounter:
+    # query_count.json plus a log of absolute values: the newest record is the
+    # current count, so reading or bumping it never scans the whole log.
+    def __init__(self, file_path: Optional[str], compact_every: int = COMPACT_EVERY, fsync: bool = True):
+        self.log = WriteAheadLog(file_path, fsync) if file_path else None
+        self.compact_every = compact_every
+        self._value = 0
+        self._lock = threading.Lock()
+        self.reload()
+
+    @property
+    def value(self) -> int:
+        return self._value
+
+    def reload(self) -> int:
+        if self.log is not None:
+            with self.log.locked():
+                data = self.log.read_base() or {}
+                records = self.log.read_records(after=data.get(SEQ_KEY, 0))
+            self._value = records[-1]["value"] if records else data.get("query_count", 0)
+        return self._value
+
+    def try_increment(self, limit: Optional[int] = None, by: int = 1) -> Optional[int]:
+        # Returns the new count, or None if it would pass the limit
+        if self.log is None:
+            with self._lock:
+                if limit is not None and self._value + by > limit:
+                    return None
+                self._value += by
+                return self._value
+
+        def next_value(last: Optional[dict], base: Optional[dict]) -> Optional[dict]:
+            current = last["value"] if last else (base or {}).get("query_count", 0)
+            if limit is not None and current + by > limit:
+                self._value = current
+                return None
+            return {"op": "set", "value": current + by}
+
+        record = self.log.append(next_value)
+        if record is None:
+            return None
+        self._value = record["value"]
+        if record["seq"] % self.compact_every == 0:
+            self.compact()
+        return self._value
+
+    def increment(self, by: int = 1) -> int:
+        return self.try_increment(None, by)
+
+    def compact(self):
+        if self.log is not None:
+            self.log.compact(_apply_count_record, {"query_count": 0}, lambda data: {"value": data["query_count"]})
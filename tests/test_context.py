@@ -0,0 +1,24 @@
+from context import extract_topic, resolve_follow_up
+
+LAST = "what is the capital of france"
+
+
+def resolve(text: str) -> str:
+    return resolve_follow_up(text, LAST, extract_topic(LAST))
+
+
+def test_questions_ending_in_a_pronoun_are_resolved():
+    assert resolve("how big is it") == "how big is france"
+    assert resolve("show me it?") == "show me france"
+
+
+def test_statements_ending_in_a_pronoun_are_left_alone():
+    assert resolve("i really like her") == "i really like her"
+    assert resolve("tell me about it") == "tell me about it"
+
+
+def test_topic_switches_take_a_short_noun_phrase():
+    assert resolve("what about germany") == "what is the capital of germany"
+    assert resolve("and what is 2 plus 2") == "and what is 2 plus 2"
+    assert resolve("and you") == "and you"
+    assert resolve("what about it") == "what about it"
@@ -0,0 +1,34 @@
+from benchmarks.fakes import FakeClient
+from core import ChatEngine, Session
+from knowledge_base import KnowledgeBase
+from remote import RemoteResult
+
+
+class OneAnswerClient(FakeClient):
+    # Knows the capital of France and nothing else
+    def query(self, question: str) -> RemoteResult:
+        if question == "what is the capital of france":
+            return super().query(question)
+        self.queries += 1
+        return RemoteResult([])
+
+
+def test_unanswered_follow_up_costs_one_query():
+    client = OneAnswerClient()
+    engine = ChatEngine(KnowledgeBase(), client, query_limit=100)
+    session = Session()
+    engine.respond("what is the capital of france", session)
+    engine.respond("what about germany", session)  # Looked up as "what is the capital of germany"
+    engine.respond("how big is it", session)  # As "how big is france"
+    assert client.queries == 3
+    assert engine.query_count == 3
+
+
+def test_follow_up_falls_back_to_the_knowledge_base():
+    knowledge_base = KnowledgeBase({"questions": [{"question": "love it", "answer": "Me too"}]})
+    client = OneAnswerClient()
+    engine = ChatEngine(knowledge_base, client, query_limit=100)
+    session = Session()
+    engine.respond("what is the capital of france", session)
+    assert engine.respond("love it?", session).text == "Me too"  # "love france" has no answer
+    assert client.queries == 2
@@ -0,0 +1,27 @@
+import asyncio
+
+import pytest
+
+from benchmarks.fake_arduino import FakeArduino
+from device import SerialDevice
+
+pytest.importorskip("serial")
+
+
+def test_unanswered_command_does_not_shift_later_replies():
+    arduino = FakeArduino(boot_delay=0.05, ignore=["reboot"]).start()
+
+    async def session():
+        device = SerialDevice(arduino.port)
+        await device.open()
+        try:
+            with pytest.raises(asyncio.TimeoutError):
+                await device.command("reboot", 0.2)
+            return [await device.command("turn_on", 1), await device.command("turn_off", 1)]
+        finally:
+            await device.close()
+
+    try:
+        assert asyncio.run(session()) == ["Light is on", "Light is off"]
+    finally:
+        arduino.close()
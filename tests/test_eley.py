@@ -0,0 +1,70 @@
+import asyncio
+import json
+import time
+
+from benchmarks.fakes import FakeClient, FakeDevice, FakeSpeech, ScriptedInput
+from eley import ChatBot
+from speech import Utterance
+from tts import OfflineEngine
+
+
+class SilentThenQuit:
+    # A SpeechFrontEnd where nobody speaks for `silences` listens, then the user says "quit"
+    def __init__(self, silences: int):
+        self.silences = silences
+
+    def start(self):
+        return self
+
+    def close(self):
+        pass
+
+    def mute(self):
+        pass
+
+    def unmute(self):
+        pass
+
+    def listen(self, timeout=None):
+        if self.silences:
+            self.silences -= 1
+            return None
+        now = time.perf_counter()
+        return Utterance("quit", 0.1, now, now)
+
+
+def test_silence_is_not_routed(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    client = FakeClient()
+    spoken = []
+
+    class Bot(ChatBot):
+        async def say(self, text, started):
+            spoken.append(text)
+
+    bot = Bot("", 10, "knowledge_base.json", "query_count.json", "", 0, tts_engine=OfflineEngine(),
+              client=client, speech=SilentThenQuit(2), device=FakeDevice())
+    asyncio.run(bot.chat_bot())
+    assert client.queries == 0
+    assert spoken == ["Goodbye!"]
+
+
+def test_lookups_go_through_the_engine(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with open("knowledge_base.json", "w") as file:
+        json.dump({"questions": [{"question": "Who is my dad", "answer": "Your dad is Yash"}]}, file)
+    client = FakeClient()
+    spoken = []
+
+    class Bot(ChatBot):
+        async def say(self, text, started):
+            spoken.append(text)
+
+    script = ScriptedInput(["who is my dad", "how far is the moon", "how far is the moon"])
+    bot = Bot("", 10, "knowledge_base.json", "query_count.json", "", 0, tts_engine=OfflineEngine(),
+              client=client, speech=FakeSpeech(script), device=FakeDevice())
+    asyncio.run(bot.chat_bot())
+    assert spoken[:3] == ["Your dad is Yash", "Answer to how far is the moon", "Answer to how far is the moon"]
+    # The repeat is served from the response cache without using up the limit
+    assert client.queries == 1
+    assert bot.query_count == 1
@@ -0,0 +1,29 @@
+import json
+
+from response_cache import ResponseCache
+
+
+def test_save_keeps_evictions_and_lru_order(tmp_path):
+    path = str(tmp_path / "cache.json")
+    cache = ResponseCache(path, max_entries=2)
+    cache.put("a", "A")
+    cache.put("b", "B")
+    assert cache.lookup("a") == (True, "A")  # b is now the least recently used
+    cache.put("c", "C")
+    cache.save()
+    assert cache.stats["evictions"] == 1
+    with open(path) as file:
+        assert list(json.load(file)["entries"]) == ["a", "c"]
+    assert ResponseCache(path, max_entries=2).lookup("b") == (False, None)
+
+
+def test_answers_logged_by_another_process_are_kept(tmp_path):
+    path = str(tmp_path / "cache.json")
+    first, second = ResponseCache(path), ResponseCache(path)
+    first.put("a", "A")
+    second.put("b", "B")
+    first.put("c", "C")
+    first.save()
+    reloaded = ResponseCache(path)
+    assert [reloaded.lookup(key) for key in "abc"] == [(True, "A"), (True, "B"), (True, "C")]
+    assert first.stats["evictions"] == 0
@@ -0,0 +1,26 @@
+import json
+import os
+import pickle
+
+import pytest
+
+from knowledge_base import KnowledgeBase
+from storage import SNAPSHOT_VERSION, KnowledgeBaseStore
+
+
+@pytest.mark.skipif(not hasattr(os, "getuid"), reason="no file owners to check")
+def test_writable_snapshot_is_not_unpickled(tmp_path):
+    path = str(tmp_path / "knowledge_base.json")
+    with open(path, "w") as file:
+        json.dump({"questions": [{"question": "Hey", "answer": "Hello"}]}, file)
+    store = KnowledgeBaseStore(path)
+    assert store.load().get_answer("Hey") == "Hello"
+
+    # Someone else rewrites the snapshot, matching the JSON file's stamp
+    stat = os.stat(path)
+    planted = KnowledgeBase({"questions": [{"question": "Hey", "answer": "Planted"}]})
+    with open(store.snapshot_path, "wb") as file:
+        pickle.dump({"version": SNAPSHOT_VERSION, "stamp": (stat.st_size, stat.st_mtime_ns), "options": {},
+                     "knowledge_base": planted}, file)
+    os.chmod(store.snapshot_path, 0o666)
+    assert KnowledgeBaseStore(path).load().get_answer("Hey") == "Hello"
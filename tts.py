@@ -0,0 +1,174 @@
+import argparse
+import contextvars
+import hashlib
+import io
+import os
+import re
+import tempfile
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Type
+
+AUDIO_CACHE_DIR = "audio_cache"
+MAX_CHUNK_CHARS = 200
+
+_SENTENCE_END = re.compile(r'(?<=[.!?;:])\s+|\n+')
+
+
+class TTSEngine:
+    name = "base"
+    extension = "mp3"
+
+    def synthesize(self, text: str, lang: str = 'en') -> bytes:
+        raise NotImplementedError
+
+
+class GTTSEngine(TTSEngine):
+    name = "gtts"
+    extension = "mp3"
+
+    def synthesize(self, text: str, lang: str = 'en') -> bytes:
+        from gtts import gTTS
+
+        buffer = io.BytesIO()
+        gTTS(text=text, lang=lang).write_to_fp(buffer)
+        return buffer.getvalue()
+
+
+class OfflineEngine(TTSEngine):
+    # Writes silent WAV audio sized to the text, so everything around synthesis
+    # can run without network access.
+    name = "offline"
+    extension = "wav"
+
+    def __init__(self, sample_rate: int = 8000, seconds_per_char: float = 0.01):
+        self.sample_rate = sample_rate
+        self.seconds_per_char = seconds_per_char
+
+    def synthesize(self, text: str, lang: str = 'en') -> bytes:
+        frames = int(len(text) * self.seconds_per_char * self.sample_rate)
+        buffer = io.BytesIO()
+        with wave.open(buffer, 'wb') as audio:
+            audio.setnchannels(1)
+            audio.setsampwidth(2)
+            audio.setframerate(self.sample_rate)
+            audio.writeframes(b'\x00\x00' * frames)
+        return buffer.getvalue()
+
+
+ENGINES: Dict[str, Type[TTSEngine]] = {
+    GTTSEngine.name: GTTSEngine,
+    OfflineEngine.name: OfflineEngine,
+}
+
+
+def audio_key(text: str, lang: str, engine_name: str) -> str:
+    return hashlib.sha256(f"{engine_name}\0{lang}\0{text}".encode('utf-8')).hexdigest()
+
+
+class AudioCache:
+    def __init__(self, directory: str = AUDIO_CACHE_DIR, engine: Optional[TTSEngine] = None, lang: str = 'en'):
+        self.directory = directory
+        self.engine = engine or GTTSEngine()
+        self.lang = lang
+        os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, text: str) -> str:
+        key = audio_key(text, self.lang, self.engine.name)
+        return os.path.join(self.directory, f"{key}.{self.engine.extension}")
+
+    def __contains__(self, text: str) -> bool:
+        return os.path.exists(self.path_for(text))
+
+    def get_path(self, text: str) -> str:
+        path = self.path_for(text)
+        if not os.path.exists(path):
+            audio = self.engine.synthesize(text, self.lang)
+            # Write to a temporary file first so a half-written clip is never played
+            with tempfile.NamedTemporaryFile('wb', dir=self.directory, delete=False, suffix='.tmp') as file:
+                file.write(audio)
+            os.replace(file.name, path)
+        return path
+
+    def get_bytes(self, text: str) -> bytes:
+        with open(self.get_path(text), 'rb') as file:
+            return file.read()
+
+    def warm(self, texts: Iterable[str], workers: int = 4) -> int:
+        missing = [text for text in dict.fromkeys(texts) if text and text not in self]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(self.get_path, missing))
+        return len(missing)
+
+
+def split_sentences(text: str, max_chars: int = MAX_CHUNK_CHARS) -> List[str]:
+    chunks = []
+    for sentence in _SENTENCE_END.split(text):
+        sentence = sentence.strip()
+        # Very long sentences (Wolfram tables, lists) are cut at word boundaries
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(' ', 0, max_chars)
+            if cut <= 0:
+                cut = max_chars
+            chunks.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+        if sentence:
+            chunks.append(sentence)
+    return chunks
+
+
+class StreamingSpeaker:
+    # Synthesizes all chunks of a reply concurrently and plays them in order,
+    # starting as soon as the first one is ready instead of after the last.
+    def __init__(self, synthesize: Callable[[str], str], play: Callable[[str], None], workers: int = 4,
+                 max_chars: int = MAX_CHUNK_CHARS):
+        self.synthesize = synthesize
+        self.play = play
+        self.max_chars = max_chars
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.first_audio_latencies: List[float] = []
+
+    def speak(self, text: str) -> Optional[float]:
+        started = time.perf_counter()
+        # Each chunk runs in a copy of our context so tracing spans stay with this turn
+        futures = [self.executor.submit(contextvars.copy_context().run, self.synthesize, chunk)
+                   for chunk in split_sentences(text, self.max_chars)]
+        first_audio = None
+        try:
+            for future in futures:
+                audio_file = future.result()
+                if first_audio is None:
+                    first_audio = time.perf_counter() - started
+                    self.first_audio_latencies.append(first_audio)
+                self.play(audio_file)
+        finally:
+            for future in futures:
+                future.cancel()
+        return first_audio
+
+
+def main():
+    from responses import STATIC_RESPONSES
+    from storage import KnowledgeBaseStore
+
+    parser = argparse.ArgumentParser(description="Pre-render speech for every fixed reply and knowledge-base answer")
+    parser.add_argument("command", choices=["warm"])
+    parser.add_argument("--knowledge-base", default="knowledge_base.json")
+    parser.add_argument("--cache-dir", default=AUDIO_CACHE_DIR)
+    parser.add_argument("--engine", choices=sorted(ENGINES), default=GTTSEngine.name)
+    parser.add_argument("--lang", default='en')
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    knowledge_base = KnowledgeBaseStore(args.knowledge_base).load()
+    cache = AudioCache(args.cache_dir, ENGINES[args.engine](), args.lang)
+    # Replies are spoken chunk by chunk, so those are the clips worth caching
+    texts = [chunk for text in STATIC_RESPONSES + [entry["answer"] for entry in knowledge_base]
+             for chunk in split_sentences(text)]
+    rendered = cache.warm(texts, args.workers)
+    print(f"Rendered {rendered} new clips ({len(set(texts))} texts) into {args.cache_dir}")
+
+
+if __name__ == '__main__':
+    main()